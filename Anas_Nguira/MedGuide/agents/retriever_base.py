@@ -0,0 +1,40 @@
+class BaseRetriever:
+    """
+    Interface commune des backends de recherche (Chroma, FAISS, BM25, hybride).
+    Les scores sont « plus grand = plus pertinent ».
+    """
+
+    specialty = None
+
+    def retrieve_scored(self, query, k=3, query_embedding=None):
+        """Retourne une liste de (document, score), du plus au moins pertinent."""
+        raise NotImplementedError
+
+    def retrieve(self, query, k=3, query_embedding=None):
+        """
+        Retourne une liste plate de documents texte.
+        """
+        return [doc for doc, _ in self.retrieve_scored(query, k, query_embedding)]
+
+    def confident_hits(self, query, k=3):
+        """
+        Résultats obtenus sans encoder la question (BM25 confiant), sinon None.
+        Les backends purement denses n'en ont jamais.
+        """
+        return None
+
+    def dense_scored(self, query, k=3, query_embedding=None):
+        """
+        Comme retrieve_scored, mais le score est toujours la similarité cosinus avec
+        l'embedding de la question : comparable d'une collection à l'autre (BM25 et
+        la fusion hybride ne le sont pas). Les backends denses renvoient déjà ce score.
+        """
+        return self.retrieve_scored(query, k, query_embedding)
+
+    def documents(self):
+        """Tous les chunks indexés (sert à construire l'index BM25)."""
+        raise NotImplementedError
+
+    def corpus_embeddings(self):
+        """Embeddings de tous les chunks (sert aux centroïdes du routeur)."""
+        raise NotImplementedError
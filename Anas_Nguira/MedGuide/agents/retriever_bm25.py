@@ -0,0 +1,92 @@
+from collections import defaultdict
+from agents.retriever_base import BaseRetriever
+import unicodedata
+import math
+import re
+import os
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Seuils de confiance du mode hybride (surchargeables via .env)
+BM25_MIN_SCORE = float(os.getenv("MEDGUIDE_BM25_MIN_SCORE", "2.0"))
+BM25_MARGIN = float(os.getenv("MEDGUIDE_BM25_MARGIN", "1.5"))
+
+_TOKEN = re.compile(r"\w+")
+STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "de", "du", "et", "ou", "en", "au", "aux",
+    "a", "à", "je", "j", "il", "elle", "on", "ce", "ca", "ça", "que", "qui", "est",
+    "sont", "pour", "par", "sur", "dans", "avec", "pas", "ne", "se", "sa", "son",
+    "ses", "mon", "ma", "mes", "l", "d", "qu", "n", "s", "y",
+}
+
+
+def tokenize(text):
+    """Minuscules, sans accents (« cœur » et « coeur » se rejoignent), sans mots vides."""
+    text = unicodedata.normalize("NFKD", text.lower().replace("œ", "oe"))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN.findall(text) if t not in STOPWORDS]
+
+
+class BM25Retriever(BaseRetriever):
+    """
+    Index inversé BM25 en mémoire sur les chunks d'une spécialité.
+    Aucune dépendance ni appel à l'encodeur : seuls les termes de la question sont parcourus.
+    Le backend `dense` de la même collection fournit les embeddings du corpus (routeur)
+    et dense_scored (comparaison entre spécialités).
+    """
+
+    def __init__(self, specialty, documents, dense):
+        self.specialty = specialty
+        self.dense = dense
+        self._docs = list(documents)
+        self._postings = defaultdict(list)  # terme -> [(indice du doc, fréquence)]
+        self._lengths = []
+        for i, doc in enumerate(self._docs):
+            tokens = tokenize(doc)
+            self._lengths.append(len(tokens))
+            counts = defaultdict(int)
+            for t in tokens:
+                counts[t] += 1
+            for t, tf in counts.items():
+                self._postings[t].append((i, tf))
+        n = len(self._docs)
+        self._avgdl = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {
+            t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for t, p in self._postings.items()
+        }
+
+    def _scores(self, query):
+        scores = defaultdict(float)
+        for t in set(tokenize(query)):
+            idf = self._idf.get(t)
+            if idf is None:
+                continue
+            for i, tf in self._postings[t]:
+                norm = 1 - BM25_B + BM25_B * self._lengths[i] / (self._avgdl or 1)
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        return scores
+
+    def retrieve_scored(self, query, k=3, query_embedding=None):
+        scores = self._scores(query)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self._docs[i], s) for i, s in best]
+
+    def is_confident(self, scored):
+        """Vrai si le meilleur résultat est à la fois fort et nettement devant le suivant."""
+        if not scored or scored[0][1] < BM25_MIN_SCORE:
+            return False
+        return len(scored) == 1 or scored[0][1] >= BM25_MARGIN * scored[1][1]
+
+    def confident_hits(self, query, k=3):
+        hits = self.retrieve_scored(query, k * 3)
+        return hits[:k] if self.is_confident(hits) else None
+
+    def dense_scored(self, query, k=3, query_embedding=None):
+        return self.dense.retrieve_scored(query, k, query_embedding)
+
+    def documents(self):
+        return list(self._docs)
+
+    def corpus_embeddings(self):
+        return self.dense.corpus_embeddings()
@@ -1,27 +1,120 @@
 import chromadb
 from chromadb.utils import embedding_functions
+from collections import OrderedDict
+from agents.retriever_base import BaseRetriever
+import threading
+import os
 
-class ChromaRetriever:
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHROMA_PATH = "chroma_db"
+QUERY_CACHE_SIZE = int(os.getenv("MEDGUIDE_QUERY_CACHE_SIZE", "1024"))
+
+# ======================================================
+#  Client Chroma et modèle d'embedding partagés par le processus
+# ======================================================
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_client():
+    """Un seul PersistentClient pour toutes les spécialités."""
+    with _shared_lock:
+        if "client" not in _shared:
+            _shared["client"] = chromadb.PersistentClient(path=CHROMA_PATH)
+        return _shared["client"]
+
+
+def get_embedder():
+    """Un seul all-MiniLM-L6-v2 chargé en mémoire, quel que soit le nombre de collections."""
+    with _shared_lock:
+        if "embedder" not in _shared:
+            _shared["embedder"] = embedding_functions.SentenceTransformerEmbeddingFunction(
+                model_name=EMBEDDING_MODEL
+            )
+        return _shared["embedder"]
+
+
+class QueryEmbeddingCache:
+    """Cache LRU borné des embeddings de requêtes, avec compteurs hit/miss."""
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query):
+        # les reformulations identiques (casse, espaces) partagent la même entrée
+        return " ".join(query.lower().split())
+
+    def embed(self, query):
+        key = self._key(query)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        vector = list(get_embedder()([query])[0])
+
+        with self._lock:
+            self._data[key] = vector
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return vector
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+query_cache = QueryEmbeddingCache()
+
+
+def embed_query(query):
+    return query_cache.embed(query)
+
+
+class ChromaRetriever(BaseRetriever):
     def __init__(self, specialty):
         self.specialty = specialty
-        self.client = chromadb.PersistentClient(path="chroma_db")
-        self.embedder = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        self.client = get_client()
+        self.embedder = get_embedder()
         self.collection = self.client.get_collection(
             name=specialty, embedding_function=self.embedder
         )
 
-    def retrieve(self, query, k=3):
+    def retrieve_scored(self, query, k=3, query_embedding=None):
         """
-        Retourne une liste plate de documents texte.
+        Si l'embedding de la question est déjà connu (routeur), il est réutilisé.
         """
+        if query_embedding is None:
+            query_embedding = embed_query(query)
         results = self.collection.query(
-            query_texts=[query],
+            query_embeddings=[query_embedding],
             n_results=k,
-            include=["documents"]
+            include=["documents", "distances"]
         )
         # results["documents"] est une liste de listes
         docs_nested = results["documents"] or [[]]
         docs = docs_nested[0] if len(docs_nested) > 0 else []
-        return docs
+        distances = (results["distances"] or [[]])[0]
+        # espace cosinus : distance = 1 - similarité
+        return [(doc, 1.0 - float(d)) for doc, d in zip(docs, distances)]
+
+    def documents(self):
+        return self.collection.get(include=["documents"])["documents"]
+
+    def corpus_embeddings(self):
+        return self.collection.get(include=["embeddings"])["embeddings"]
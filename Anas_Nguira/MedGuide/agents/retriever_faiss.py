@@ -0,0 +1,41 @@
+from agents.retriever_base import BaseRetriever
+from agents.retriever_chroma import embed_query
+import numpy as np
+import pickle
+import faiss
+import os
+
+INDEX_DIR = "indexes"
+
+
+class FaissRetriever(BaseRetriever):
+    """
+    Backend FAISS sur les fichiers indexes/<spécialité>_index.faiss et _docs.pkl.
+    L'index est memory-mappé : démarrage à froid sans copie en RAM.
+    """
+
+    def __init__(self, specialty, index_dir=INDEX_DIR):
+        self.specialty = specialty
+        self.index = faiss.read_index(
+            os.path.join(index_dir, f"{specialty}_index.faiss"),
+            faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        )
+        with open(os.path.join(index_dir, f"{specialty}_docs.pkl"), "rb") as f:
+            self._docs = pickle.load(f)
+
+    def retrieve_scored(self, query, k=3, query_embedding=None):
+        if query_embedding is None:
+            query_embedding = embed_query(query)
+        q = np.asarray([query_embedding], dtype=np.float32)
+        distances, indices = self.index.search(q, min(k, self.index.ntotal))
+        # embeddings normalisés : distance L2² = 2 - 2·cos, on renvoie le cosinus
+        return [
+            (self._docs[i], 1.0 - float(d) / 2)
+            for d, i in zip(distances[0], indices[0]) if i != -1
+        ]
+
+    def documents(self):
+        return list(self._docs)
+
+    def corpus_embeddings(self):
+        return self.index.reconstruct_n(0, self.index.ntotal)
@@ -0,0 +1,54 @@
+from agents.retriever_base import BaseRetriever
+import os
+
+HYBRID_ALPHA = float(os.getenv("MEDGUIDE_HYBRID_ALPHA", "0.5"))
+
+
+def _minmax(scored):
+    if not scored:
+        return {}
+    values = [s for _, s in scored]
+    low, high = min(values), max(values)
+    span = (high - low) or 1.0
+    return {doc: (s - low) / span for doc, s in scored}
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fusion lexicale (BM25) + dense (Chroma ou FAISS).
+    Si BM25 est confiant (mot-clé médical net : « infarctus », « AVC »),
+    ses résultats sont renvoyés directement, sans recherche vectorielle.
+    Sinon les deux listes sont normalisées puis combinées :
+    alpha · dense + (1 - alpha) · lexical.
+    """
+
+    def __init__(self, lexical, dense, alpha=HYBRID_ALPHA):
+        self.specialty = dense.specialty
+        self.lexical = lexical
+        self.dense = dense
+        self.alpha = alpha
+
+    def confident_hits(self, query, k=3):
+        return self.lexical.confident_hits(query, k)
+
+    def retrieve_scored(self, query, k=3, query_embedding=None):
+        lexical = self.lexical.retrieve_scored(query, k * 3)
+        if self.lexical.is_confident(lexical):
+            return lexical[:k]
+
+        dense = self.dense.retrieve_scored(query, k * 3, query_embedding)
+        lex_norm, dense_norm = _minmax(lexical), _minmax(dense)
+        fused = {
+            doc: self.alpha * dense_norm.get(doc, 0.0) + (1 - self.alpha) * lex_norm.get(doc, 0.0)
+            for doc in set(lex_norm) | set(dense_norm)
+        }
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def dense_scored(self, query, k=3, query_embedding=None):
+        return self.dense.retrieve_scored(query, k, query_embedding)
+
+    def documents(self):
+        return self.dense.documents()
+
+    def corpus_embeddings(self):
+        return self.dense.corpus_embeddings()
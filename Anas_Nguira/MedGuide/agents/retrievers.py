@@ -0,0 +1,31 @@
+import os
+
+# chroma | faiss | bm25 | hybrid
+RETRIEVER_BACKEND = os.getenv("MEDGUIDE_RETRIEVER", "chroma")
+# backend dense utilisé par le mode hybride : chroma | faiss
+DENSE_BACKEND = os.getenv("MEDGUIDE_DENSE_BACKEND", "chroma")
+
+
+def _dense(specialty, backend):
+    if backend == "faiss":
+        from agents.retriever_faiss import FaissRetriever
+        return FaissRetriever(specialty)
+    from agents.retriever_chroma import ChromaRetriever
+    return ChromaRetriever(specialty)
+
+
+def build_retriever(specialty, backend=RETRIEVER_BACKEND):
+    """Construit le retriever d'une spécialité pour le backend demandé."""
+    if backend in ("chroma", "faiss"):
+        return _dense(specialty, backend)
+
+    from agents.retriever_bm25 import BM25Retriever
+    dense = _dense(specialty, DENSE_BACKEND)
+    lexical = BM25Retriever(specialty, dense.documents(), dense)
+    if backend == "bm25":
+        return lexical
+    if backend == "hybrid":
+        from agents.retriever_hybrid import HybridRetriever
+        return HybridRetriever(lexical, dense)
+    raise ValueError(f"Backend de recherche inconnu : {backend}")
+
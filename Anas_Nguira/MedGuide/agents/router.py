@@ -0,0 +1,66 @@
+import numpy as np
+import os
+from agents.retriever_chroma import embed_query
+
+AGENTS_DIR = "agents"
+# écart minimal de similarité entre les deux meilleures spécialités pour trancher
+ROUTER_MARGIN = float(os.getenv("MEDGUIDE_ROUTER_MARGIN", "0.03"))
+
+
+def discover_specialties(agents_dir=AGENTS_DIR):
+    """Une spécialité par dossier agents/<nom>/data."""
+    return sorted(
+        name for name in os.listdir(agents_dir)
+        if os.path.isdir(os.path.join(agents_dir, name, "data"))
+    )
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingRouter:
+    """
+    Routage par similarité : la question est encodée une seule fois puis comparée
+    au centroïde des chunks de chaque spécialité. Le même vecteur sert ensuite
+    à la recherche dans la collection choisie. Les centroïdes viennent des embeddings
+    déjà stockés dans l'index : pas de ré-encodage du corpus au démarrage.
+
+    Avec `retrievers` (backends bm25 / hybrid), BM25 est consulté d'abord : si une seule
+    spécialité a un résultat lexical confiant, elle est choisie sans encoder la question.
+    """
+
+    def __init__(self, corpus_embeddings, retrievers=None):
+        # corpus_embeddings : spécialité -> embeddings de ses chunks (déjà calculés à l'indexation)
+        self.specialties = list(corpus_embeddings)
+        self.retrievers = retrievers or {}
+        self.centroids = self._build_centroids(corpus_embeddings)
+
+    def _build_centroids(self, corpus_embeddings):
+        centroids = []
+        for spec in self.specialties:
+            vectors = _normalize(np.asarray(corpus_embeddings[spec], dtype=np.float32))
+            centroids.append(vectors.mean(axis=0))
+        return _normalize(np.stack(centroids))
+
+    def scores(self, vector):
+        q = _normalize(np.asarray(vector, dtype=np.float32))
+        return dict(zip(self.specialties, (self.centroids @ q).tolist()))
+
+    def route(self, query):
+        """
+        Retourne (spécialité, embedding de la question, ambiguë).
+        La question est ambiguë quand les deux meilleures spécialités sont
+        à moins de ROUTER_MARGIN l'une de l'autre. L'embedding vaut None
+        quand BM25 a suffi à trancher.
+        """
+        confident = [spec for spec, r in self.retrievers.items() if r.confident_hits(query)]
+        if len(confident) == 1:
+            return confident[0], None, False
+
+        vector = embed_query(query)
+        scores = self.scores(vector)
+        ranked = sorted(scores.values(), reverse=True)
+        ambiguous = len(ranked) > 1 and ranked[0] - ranked[1] < ROUTER_MARGIN
+        return max(scores, key=scores.get), vector, ambiguous
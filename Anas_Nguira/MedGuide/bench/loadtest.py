@@ -0,0 +1,205 @@
+"""
+Banc de charge MedGuide : démarre un stub LLM local (bench/stub_llm.py) et main.py,
+rejoue bench/questions_fr.txt à plusieurs niveaux de concurrence puis affiche
+p50/p95/p99, requêtes/s et la durée moyenne de chaque étape (/metrics).
+
+    python bench/loadtest.py --concurrency 1 4 16 --requests 60
+    python bench/loadtest.py --save-baseline bench/baseline.json
+    python bench/loadtest.py --baseline bench/baseline.json --max-regression 0.10
+
+Avec --baseline, le code de sortie vaut 1 si le débit baisse (ou si le p95 augmente)
+de plus de --max-regression par rapport à la référence : utilisable en CI.
+"""
+from collections import defaultdict
+import subprocess
+import argparse
+import asyncio
+import httpx
+import json
+import time
+import uuid
+import math
+import sys
+import os
+import re
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+_SAMPLE = re.compile(r'^(medguide_stage_seconds_(?:sum|count))\{([^}]*)\} (\S+)$')
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # rang le plus proche
+    rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def start(cmd, env, name):
+    print(f"▶ {name} : {' '.join(cmd)}")
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} pas prêt après {timeout}s")
+
+
+def scrape_stages(base_url):
+    """Somme et nombre d'observations par étape, tous labels confondus."""
+    text = httpx.get(f"{base_url}/metrics", timeout=10).text
+    stages = defaultdict(lambda: [0.0, 0])
+    for line in text.splitlines():
+        m = _SAMPLE.match(line)
+        if not m:
+            continue
+        stage = re.search(r'stage="([^"]*)"', m.group(2)).group(1)
+        stages[stage][0 if m.group(1).endswith("_sum") else 1] += float(m.group(3))
+    return stages
+
+
+async def run_level(base_url, questions, concurrency, n_requests, stream):
+    queue = asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(questions[i % len(questions)])
+    latencies, errors = [], 0
+    endpoint = "/ask/stream" if stream else "/ask"
+
+    async def worker(client):
+        nonlocal errors
+        while True:
+            try:
+                query = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            try:
+                # une session par requête : premier tour, mémoire vide
+                resp = await client.post(endpoint, params={"query": query},
+                                         headers={"X-Session-Id": uuid.uuid4().hex})
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+
+    return {
+        "requests": n_requests,
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+    }
+
+
+def compare(results, baseline, max_regression):
+    failures = []
+    for level, current in results.items():
+        ref = baseline.get(level)
+        if not ref:
+            continue
+        if current["rps"] < ref["rps"] * (1 - max_regression):
+            failures.append(f"c={level} : débit {current['rps']} req/s < référence {ref['rps']}")
+        if current["p95"] > ref["p95"] * (1 + max_regression):
+            failures.append(f"c={level} : p95 {current['p95']}s > référence {ref['p95']}s")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=60, help="requêtes par niveau de concurrence")
+    parser.add_argument("--questions", default=os.path.join(HERE, "questions_fr.txt"))
+    parser.add_argument("--stream", action="store_true", help="utiliser /ask/stream au lieu de /ask")
+    parser.add_argument("--answer-cache", action="store_true", help="laisser actif le cache sémantique")
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--stub-tokens-per-s", type=float, default=50)
+    parser.add_argument("--stub-completion-tokens", type=int, default=200)
+    parser.add_argument("--stub-port", type=int, default=9900)
+    parser.add_argument("--port", type=int, default=9901)
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--baseline", help="JSON de référence à comparer")
+    parser.add_argument("--save-baseline", help="écrire les résultats comme nouvelle référence")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [q.strip() for q in f if q.strip()]
+
+    env = dict(os.environ)
+    env.update({
+        "STUB_LATENCY_MS": str(args.stub_latency_ms),
+        "STUB_TOKENS_PER_S": str(args.stub_tokens_per_s),
+        "STUB_COMPLETION_TOKENS": str(args.stub_completion_tokens),
+        "ESPRIT_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+        "ESPRIT_API_KEY": env.get("ESPRIT_API_KEY", "bench"),
+        # pas de log « requête lente » pendant le bench
+        "MEDGUIDE_SLOW_REQUEST_MS": "1e12",
+    })
+    if not args.answer_cache:
+        env["MEDGUIDE_ANSWER_CACHE_SIZE"] = "0"
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    procs = [
+        start([sys.executable, "-m", "uvicorn", "bench.stub_llm:app", "--port", str(args.stub_port)], env, "stub LLM"),
+        start([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port)], env, "MedGuide"),
+    ]
+    try:
+        wait_ready(f"http://127.0.0.1:{args.stub_port}/docs", args.startup_timeout)
+        t0 = time.perf_counter()
+        wait_ready(f"{base_url}/readyz", args.startup_timeout)
+        print(f"✅ MedGuide prêt en {time.perf_counter() - t0:.1f}s\n")
+
+        results = {}
+        for level in args.concurrency:
+            before = scrape_stages(base_url)
+            res = asyncio.run(run_level(base_url, questions, level, args.requests, args.stream))
+            after = scrape_stages(base_url)
+            res["stages_ms"] = {
+                stage: round((after[stage][0] - before[stage][0]) / (after[stage][1] - before[stage][1]) * 1000, 2)
+                for stage in after if after[stage][1] > before[stage][1]
+            }
+            results[str(level)] = res
+            print(f"c={level:<3} {res['rps']:>7} req/s  p50={res['p50']:.3f}s  p95={res['p95']:.3f}s  "
+                  f"p99={res['p99']:.3f}s  erreurs={res['errors']}")
+            print("      étapes (ms) : " + ", ".join(f"{k}={v}" for k, v in res["stages_ms"].items()))
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=30)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Référence enregistrée dans {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare(results, json.load(f), args.max_regression)
+        if failures:
+            print("\n❌ Régression de performance :")
+            for failure in failures:
+                print("   - " + failure)
+            sys.exit(1)
+        print("\n✅ Pas de régression par rapport à la référence")
+
+
+if __name__ == "__main__":
+    main()
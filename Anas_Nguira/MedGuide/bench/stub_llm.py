@@ -0,0 +1,75 @@
+"""
+Serveur local compatible OpenAI (/v1/chat/completions) qui imite le LLM Esprit
+sans GPU ni réseau : latence avant le premier token et débit de tokens réglables.
+
+    STUB_LATENCY_MS=300 STUB_TOKENS_PER_S=40 STUB_COMPLETION_TOKENS=200 \
+        uvicorn bench.stub_llm:app --port 9000
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import time
+import uuid
+import os
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "300"))
+TOKENS_PER_S = float(os.getenv("STUB_TOKENS_PER_S", "50"))
+COMPLETION_TOKENS = int(os.getenv("STUB_COMPLETION_TOKENS", "200"))
+
+app = FastAPI(title="Stub LLM OpenAI-compatible")
+
+WORDS = ("Ces symptômes doivent être surveillés attentivement. "
+         "En cas de douleur intense ou persistante, appelez le 190. ").split()
+
+
+def _prompt_tokens(messages):
+    # même estimation que EspritLLM.get_num_tokens
+    return sum(len(m.get("content") or "") for m in messages) // 4
+
+
+def _chunk(cid, model, delta, finish=None, usage=None):
+    return {
+        "id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+        "usage": usage,
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    n_tokens = min(COMPLETION_TOKENS, body.get("max_tokens") or COMPLETION_TOKENS)
+    tokens = [WORDS[i % len(WORDS)] + " " for i in range(n_tokens)]
+    usage = {
+        "prompt_tokens": _prompt_tokens(body.get("messages", [])),
+        "completion_tokens": n_tokens,
+        "total_tokens": _prompt_tokens(body.get("messages", [])) + n_tokens,
+    }
+    cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    delay = 1.0 / TOKENS_PER_S if TOKENS_PER_S > 0 else 0.0
+
+    if body.get("stream"):
+        async def events():
+            await asyncio.sleep(LATENCY_MS / 1000)
+            yield f"data: {json.dumps(_chunk(cid, model, {'role': 'assistant', 'content': ''}))}\n\n"
+            for token in tokens:
+                yield f"data: {json.dumps(_chunk(cid, model, {'content': token}))}\n\n"
+                await asyncio.sleep(delay)
+            yield f"data: {json.dumps(_chunk(cid, model, {}, finish='stop'))}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps(_chunk(cid, model, {}, usage=usage))}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(LATENCY_MS / 1000 + n_tokens * delay)
+    return {
+        "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": "stop",
+        }],
+        "usage": usage,
+    }
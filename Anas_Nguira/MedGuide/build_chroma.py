@@ -1,84 +1,227 @@
 import os
-import chromadb
-from chromadb.utils import embedding_functions
+import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from transformers import AutoTokenizer
+from agents.retriever_chroma import get_client, get_embedder, CHROMA_PATH, EMBEDDING_MODEL
+from agents.router import discover_specialties
+
+MANIFEST_DIR = os.path.join(CHROMA_PATH, "manifests")
+EMBED_BATCH_SIZE = 64
+
+# Découpage en tokens du modèle d'embedding (all-MiniLM-L6-v2 tronque à 256 tokens)
+CHUNK_TOKENS = 128
+CHUNK_OVERLAP_TOKENS = 16
+
+# Lecture en flux : taille visée d'un bloc de texte avant découpage
+BLOCK_CHARS = 20_000
+HASH_BLOCK_BYTES = 1 << 20
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".pdf")
 
 # ===========================================================
 # 🧹 1️⃣ Fonction de nettoyage du texte brut
 # ===========================================================
+_SPACES = re.compile(r"[ \t\r]+")
+
 def clean_text(text: str) -> str:
     """
     Nettoie le texte médical : supprime espaces inutiles, retours à la ligne
-    et caractères spéciaux redondants.
+    et caractères spéciaux redondants (un seul passage, linéaire en taille).
     """
-    text = text.replace("\t", " ").replace("\r", " ")
-    while "  " in text:
-        text = text.replace("  ", " ")
-    return text.strip()
+    return _SPACES.sub(" ", text).strip()
 
 # ===========================================================
-# 🧩 2️⃣ Fonction principale : création des collections Chroma
+# 📂 2️⃣ Lecture en flux des documents d'une spécialité
 # ===========================================================
-def build_collection(specialty: str):
-    print(f"\n📘 Construction de la collection pour {specialty} ...")
+def iter_source_files(specialty: str):
+    """Tous les .txt / .md / .pdf sous agents/<spécialité>/data, dans un ordre stable."""
+    data_dir = os.path.join("agents", specialty, "data")
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(root, name)
 
-    # ---- 1. Initialiser ChromaDB local
-    client = chromadb.PersistentClient(path="chroma_db")
 
-    # ---- 2. Définir la fonction d’embedding
-    embedder = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    # ---- 3. Créer ou récupérer la collection
-    collection = client.get_or_create_collection(
-        name=specialty,
-        embedding_function=embedder
-    )
 
-    # ---- 4. Charger le texte brut de la spécialité
-    data_path = f"agents/{specialty}/data/{specialty}_docs.txt"
-    if not os.path.exists(data_path):
-        print(f"⚠️  Fichier introuvable : {data_path}")
+def iter_text_blocks(path: str):
+    """
+    Produit le texte d'un document par blocs d'environ BLOCK_CHARS caractères,
+    coupés sur une fin de paragraphe : le fichier n'est jamais chargé en entier.
+    """
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader  # dépendance optionnelle, seulement pour les PDF
+        for page in PdfReader(path).pages:
+            text = page.extract_text() or ""
+            if text.strip():
+                yield text
         return
 
-    with open(data_path, "r", encoding="utf-8") as f:
-        raw_text = f.read()
+    block, size = [], 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= BLOCK_CHARS and not line.strip():
+                yield "".join(block)
+                block, size = [], 0
+            elif size >= 2 * BLOCK_CHARS:
+                # pas de paragraphe vide depuis longtemps : on coupe sur la ligne
+                yield "".join(block)
+                block, size = [], 0
+    if block:
+        yield "".join(block)
+
+
+def make_splitter():
+    # un tokenizer par build (les tokenizers rapides ne se partagent pas entre threads)
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        tokenizer,
+        chunk_size=CHUNK_TOKENS,
+        chunk_overlap=CHUNK_OVERLAP_TOKENS,
+        separators=["\n\n", "\n", r"(?<=\. )", " ", ""],
+        is_separator_regex=True
+    )
+
+# ===========================================================
+# 🧾 3️⃣ Manifest de build : empreinte des sources et ids des chunks
+# ===========================================================
+def chunk_id(specialty: str, chunk: str) -> str:
+    """Id dérivé du contenu : modifier un paragraphe ne décale plus les autres ids."""
+    return f"{specialty}_{hashlib.sha1(chunk.encode('utf-8')).hexdigest()[:16]}"
+
 
-    # ---- 5. Nettoyer le texte
-    clean = clean_text(raw_text)
+def manifest_path(specialty: str) -> str:
+    return os.path.join(MANIFEST_DIR, f"{specialty}.json")
 
-    # ---- 6. Découpage avancé avec RecursiveCharacterTextSplitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=200,
-        chunk_overlap=100,
-        separators=["\n\n", "\n", "(?<=\. )", " ", ""],
-        length_function=len
-    )
-    chunks = text_splitter.split_text(clean)
 
-    print(f"→ {len(chunks)} chunks générés pour {specialty}")
+def load_manifest(specialty: str, collection):
+    path = manifest_path(specialty)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if "files" in manifest:
+            return manifest
+        # manifest mono-fichier : ses chunks restent réutilisables
+        return {"files": {}, "legacy_chunks": manifest.get("chunks", [])}
+    # pas encore de manifest (ancien build à ids positionnels) : on part du contenu réel
+    return {"files": {}, "legacy_chunks": collection.get(include=[])["ids"]}
+
+
+def save_manifest(specialty: str, manifest: dict):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    tmp = manifest_path(specialty) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, manifest_path(specialty))
+
+# ===========================================================
+# 🧩 4️⃣ Fonction principale : mise à jour incrémentale d'une collection
+# ===========================================================
+def build_collection(specialty: str):
+    print(f"\n📘 Construction de la collection pour {specialty} ...")
+
+    # ---- 1. Client Chroma et fonction d’embedding partagés
+    client = get_client()
+    embedder = get_embedder()
 
-    # ---- 7. Ajouter les chunks dans Chroma
-    collection.add(
-        documents=chunks,
-        ids=[f"{specialty}_{i}" for i in range(len(chunks))],
-        metadatas=[{"specialty": specialty, "chunk": i} for i in range(len(chunks))]
+    # ---- 2. Créer ou récupérer la collection
+    collection = client.get_or_create_collection(
+        name=specialty,
+        embedding_function=embedder
     )
 
-    print(f"✅ Collection '{specialty}' mise à jour ({len(chunks)} chunks)")
+    sources = list(iter_source_files(specialty))
+    if not sources:
+        print(f"⚠️  Aucun document trouvé pour {specialty}")
+        return
+
+    manifest = load_manifest(specialty, collection)
+    previous = set(manifest.get("legacy_chunks", []))
+    for entry in manifest["files"].values():
+        previous.update(entry["chunks"])
+
+    splitter = None
+    files = {}
+    seen = set()
+    pending = []  # (id, texte, source) en attente d'embedding, borné à EMBED_BATCH_SIZE
+    added = 0
+
+    def flush():
+        nonlocal added
+        if not pending:
+            return
+        documents = [doc for _, doc, _ in pending]
+        collection.upsert(
+            ids=[cid for cid, _, _ in pending],
+            documents=documents,
+            embeddings=embedder(documents),
+            metadatas=[{"specialty": specialty, "source": src} for _, _, src in pending]
+        )
+        added += len(pending)
+        pending.clear()
+
+    for path in sources:
+        digest = file_sha256(path)
+        known = manifest["files"].get(path)
+
+        # ---- 3. Fichier inchangé : ses chunks sont conservés sans relecture
+        if known and known["sha256"] == digest:
+            files[path] = known
+            seen.update(known["chunks"])
+            continue
+
+        # ---- 4. Nettoyage + découpage en tokens, bloc par bloc
+        splitter = splitter or make_splitter()
+        ids = []
+        for block in iter_text_blocks(path):
+            for chunk in splitter.split_text(clean_text(block)):
+                cid = chunk_id(specialty, chunk)
+                ids.append(cid)
+                if cid in seen:  # doublon exact (même fichier ou autre document)
+                    continue
+                seen.add(cid)
+                if cid not in previous:
+                    pending.append((cid, chunk, path))
+                    if len(pending) >= EMBED_BATCH_SIZE:
+                        flush()
+        files[path] = {"sha256": digest, "chunks": ids}
+        print(f"→ {path} : {len(ids)} chunks")
+
+    flush()
+
+    # ---- 5. Supprimer les chunks disparus (fichiers supprimés ou modifiés)
+    removed = [cid for cid in previous if cid not in seen]
+    for start in range(0, len(removed), EMBED_BATCH_SIZE * 16):
+        collection.delete(ids=removed[start:start + EMBED_BATCH_SIZE * 16])
+
+    save_manifest(specialty, {"files": files})
+
+    print(f"✅ Collection '{specialty}' mise à jour "
+          f"({len(files)} documents, +{added} / -{len(removed)} / ={len(seen) - added} chunks)")
 
 # ===========================================================
-# 🚀 3️⃣ Point d’entrée principal
+# 🚀 5️⃣ Point d’entrée principal
 # ===========================================================
 if __name__ == "__main__":
     # Créer le dossier Chroma s’il n’existe pas
-    os.makedirs("chroma_db", exist_ok=True)
+    os.makedirs(CHROMA_PATH, exist_ok=True)
 
-    # Liste des spécialités à indexer
-    specialties = ["cardio", "neuro"]
+    # Liste des spécialités à indexer (un dossier agents/<spécialité>/data chacune)
+    specialties = discover_specialties()
 
-    for sp in specialties:
-        build_collection(sp)
+    # Les spécialités sont construites en parallèle (même client, même modèle)
+    with ThreadPoolExecutor(max_workers=len(specialties)) as pool:
+        list(pool.map(build_collection, specialties))
 
     print("\n🎉 Indexation terminée avec succès !")
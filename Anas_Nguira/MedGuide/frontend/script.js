@@ -2,6 +2,12 @@ const chatBox = document.getElementById("chat-box");
 const sendBtn = document.getElementById("send-btn");
 const userInput = document.getElementById("user-input");
 
+// Identifiant de session renvoyé par le serveur (mémoire conversationnelle par patient)
+let sessionId = localStorage.getItem("medguide_session");
+
+// Nombre d'essais quand le serveur répond 503 (préchauffage) avec Retry-After
+const MAX_ATTEMPTS = 3;
+
 async function sendMessage() {
   const query = userInput.value.trim();
   if (!query) return;
@@ -10,25 +16,84 @@ async function sendMessage() {
   appendMessage("user", query);
   userInput.value = "";
 
-  // Requête POST vers ton API FastAPI
+  // Bulle du bot remplie au fur et à mesure des tokens
+  const botDiv = appendMessage("bot", "…");
+  let answer = "";
+
+  // Requête POST en streaming (Server-Sent Events) vers ton API FastAPI
   try {
-    const res = await fetch("http://127.0.0.1:8000/ask?query=" + encodeURIComponent(query), {
-      method: "POST"
-    });
-    const data = await res.json();
-    appendMessage("bot", data.answer);
+    let res;
+    for (let attempt = 1; ; attempt++) {
+      res = await fetch("http://127.0.0.1:8000/ask/stream?query=" + encodeURIComponent(query), {
+        method: "POST",
+        headers: sessionId ? { "X-Session-Id": sessionId } : {}
+      });
+      // 503 (démarrage en cours) : on réessaie après Retry-After, quelques fois au plus
+      const retryAfter = Number(res.headers.get("Retry-After"));
+      if (res.status !== 503 || !retryAfter || attempt >= MAX_ATTEMPTS) break;
+      botDiv.innerText = "⏳ Service en cours de démarrage, nouvel essai dans " + retryAfter + " s…";
+      await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+    }
+
+    // erreur HTTP : réponse JSON, pas de flux SSE à lire
+    if (!res.ok) {
+      const body = await res.json().catch(() => ({}));
+      botDiv.innerText = "❌ " + (body.detail || "Erreur du serveur (" + res.status + ").");
+      return;
+    }
+
+    const returnedId = res.headers.get("X-Session-Id");
+    if (returnedId && returnedId !== sessionId) {
+      sessionId = returnedId;
+      localStorage.setItem("medguide_session", sessionId);
+    }
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // un évènement SSE se termine par une ligne vide
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const evt = parseEvent(buffer.slice(0, sep));
+        buffer = buffer.slice(sep + 2);
+
+        if (evt.event === "token") {
+          answer += evt.data.token;
+          botDiv.innerText = answer;
+          chatBox.scrollTop = chatBox.scrollHeight;
+        } else if (evt.event === "error") {
+          botDiv.innerText = answer || "❌ Erreur lors de la génération.";
+          console.error(evt.data.error);
+        }
+      }
+    }
   } catch (error) {
-    appendMessage("bot", "❌ Erreur de connexion au serveur.");
+    botDiv.innerText = "❌ Erreur de connexion au serveur.";
     console.error(error);
   }
 }
 
+function parseEvent(raw) {
+  const evt = { event: "message", data: {} };
+  for (const line of raw.split("\n")) {
+    if (line.startsWith("event:")) evt.event = line.slice(6).trim();
+    else if (line.startsWith("data:")) evt.data = JSON.parse(line.slice(5));
+  }
+  return evt;
+}
+
 function appendMessage(sender, text) {
   const div = document.createElement("div");
   div.classList.add("message", sender);
   div.innerText = text;
   chatBox.appendChild(div);
   chatBox.scrollTop = chatBox.scrollHeight;
+  return div;
 }
 
 sendBtn.addEventListener("click", sendMessage);
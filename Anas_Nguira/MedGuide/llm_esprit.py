@@ -1,36 +1,81 @@
 import httpx
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from langchain.llms.base import LLM
-from typing import Optional, List, Any
+from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
+from langchain_core.outputs import GenerationChunk
+from typing import Optional, List, Any, Iterator, AsyncIterator
 from dotenv import load_dotenv
+import threading
+import metrics
 import os
 
+load_dotenv()  # charge le fichier .env une seule fois au démarrage
 
+# ======================================================
+#  Pool de connexions HTTP partagé par tout le processus
+# ======================================================
+HTTP_MAX_CONNECTIONS = int(os.getenv("ESPRIT_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("ESPRIT_HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("ESPRIT_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("ESPRIT_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("ESPRIT_HTTP_READ_TIMEOUT", "120"))
 
-class EspritLLM(LLM):
-    """LLM wrapper compatible LangChain pour le modèle hébergé à Esprit."""
+_clients = {}
+_clients_lock = threading.Lock()
 
-    model: str = "hosted_vllm/Llama-3.1-70B-Instruct"
-    temperature: float = 0.7
-    max_tokens: int = 500
-    top_p: float = 0.9
-    api_key: str = ""
-    base_url: str = "https://tokenfactory.esprit.tn/api"
-
-    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
-        http_client = httpx.Client(verify=False)
-        load_dotenv()  # charge automatiquement le fichier .env
-        api_key = os.getenv("ESPRIT_API_KEY")
-        client = OpenAI(
-            api_key=api_key,
-            base_url=self.base_url,
-            http_client=http_client
-        )
 
-        response = client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": f"""
+def _http_options() -> dict:
+    return {
+        "verify": False,
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    }
+
+
+def get_client(api_key: str, base_url: str, asynchronous: bool = False):
+    """
+    Retourne le client OpenAI (sync ou async) partagé pour ce couple clé / URL.
+    Les connexions TLS sont réutilisées d'un appel à l'autre (keep-alive).
+    """
+    key = (api_key, base_url, asynchronous)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                if asynchronous:
+                    client = AsyncOpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=httpx.AsyncClient(**_http_options())
+                    )
+                else:
+                    client = OpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=httpx.Client(**_http_options())
+                    )
+                _clients[key] = client
+    return client
+
+
+async def aclose_clients():
+    """Ferme proprement les pools de connexions (à appeler à l'arrêt de l'app)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        if isinstance(client, AsyncOpenAI):
+            await client.close()
+        else:
+            client.close()
+
+
+SYSTEM_PROMPT = """
                     Tu es un agent médical tunisien spécialisé.
                     Ta mission est d analyser les informations du patient selon ta spécialité
                     et de formuler des recommandations informatives, sécurisées et professionnelles.
@@ -45,19 +90,114 @@ class EspritLLM(LLM):
                     FORMAT DE RÉPONSE :
                     - Analyse selon ta spécialité
                     - Risques potentiels
-                    
+
                     - Questions à poser si nécessaire
                     - Recommandation générale (sans remplacer un médecin)
                     """
-                    },
+
+
+class EspritLLM(LLM):
+    """LLM wrapper compatible LangChain pour le modèle hébergé à Esprit."""
+
+    model: str = "hosted_vllm/Llama-3.1-70B-Instruct"
+    temperature: float = 0.7
+    max_tokens: int = 500
+    top_p: float = 0.9
+    api_key: str = ""
+    system_prompt: str = SYSTEM_PROMPT
+    base_url: str = os.getenv("ESPRIT_BASE_URL", "https://tokenfactory.esprit.tn/api")
+
+    def _completion_kwargs(self, prompt: str, stop: Optional[List[str]]) -> dict:
+        kwargs = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
                 {"role": "user", "content": prompt}
             ],
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            top_p=self.top_p
-        )
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+        }
+        if stop:
+            kwargs["stop"] = stop
+        return kwargs
+
+    def _api_key(self) -> str:
+        return self.api_key or os.getenv("ESPRIT_API_KEY")
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        client = get_client(self._api_key(), self.base_url)
+        response = client.chat.completions.create(**self._completion_kwargs(prompt, stop))
+        metrics.record_usage(response.usage)
         return response.choices[0].message.content
 
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        client = get_client(self._api_key(), self.base_url, asynchronous=True)
+        response = await client.chat.completions.create(**self._completion_kwargs(prompt, stop))
+        metrics.record_usage(response.usage)
+        return response.choices[0].message.content
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        client = get_client(self._api_key(), self.base_url)
+        stream = client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},  # dernier évènement : compteurs de tokens
+            **self._completion_kwargs(prompt, stop)
+        )
+        for event in stream:
+            metrics.record_usage(event.usage)
+            token = event.choices[0].delta.content if event.choices else None
+            if not token:
+                continue
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        client = get_client(self._api_key(), self.base_url, asynchronous=True)
+        stream = await client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},  # dernier évènement : compteurs de tokens
+            **self._completion_kwargs(prompt, stop)
+        )
+        async for event in stream:
+            metrics.record_usage(event.usage)
+            token = event.choices[0].delta.content if event.choices else None
+            if not token:
+                continue
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+
+    def get_num_tokens(self, text: str) -> int:
+        # estimation (~4 caractères par token) : évite de charger le tokenizer GPT-2
+        # de LangChain à chaque calcul du budget mémoire
+        return max(1, len(text) // 4)
+
     @property
     def _llm_type(self) -> str:
         return "esprit_llm"
@@ -1,18 +1,117 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, Request, Response, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from orchestrator import generate_answer
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse
+import startup
+import metrics
+import json
+import uuid
+import sys
 import os
 
+# langchain, chromadb et sentence-transformers ne sont importés qu'en arrière-plan
+# (startup.py) : le serveur accepte les connexions immédiatement
+
 app = FastAPI(title="MedOrient Web Interface")
 
 # servir le dossier frontend
 app.mount("/frontend", StaticFiles(directory="frontend"), name="frontend")
 
+SESSION_HEADER = "X-Session-Id"
+SESSION_COOKIE = "medguide_session"
+
+def get_session_id(request: Request) -> str:
+    """Identifiant de session : en-tête X-Session-Id, sinon cookie, sinon nouvel identifiant."""
+    return (
+        request.headers.get(SESSION_HEADER)
+        or request.cookies.get(SESSION_COOKIE)
+        or uuid.uuid4().hex
+    )
+
+def attach_session(response: Response, session_id: str):
+    response.headers[SESSION_HEADER] = session_id
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+def get_orchestrator():
+    orchestrator = startup.get_orchestrator()
+    if orchestrator is None:
+        raise HTTPException(503, "Service en cours de démarrage", headers={"Retry-After": "5"})
+    return orchestrator
+
+@app.on_event("startup")
+async def on_startup():
+    startup.start_in_background()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # fermer le pool de connexions vers le LLM (s'il a été ouvert)
+    llm_esprit = sys.modules.get("llm_esprit")
+    if llm_esprit is not None:
+        await llm_esprit.aclose_clients()
+
+@app.get("/healthz")
+def healthz():
+    """Liveness : le processus répond."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness : modèles chargés et index préchauffés ; sinon 503."""
+    body = {
+        "ready": startup.state["ready"],
+        "error": startup.state["error"],
+        "timings_ms": startup.state["timings_ms"],
+    }
+    return JSONResponse(body, status_code=200 if startup.state["ready"] else 503)
+
 @app.get("/")
 def home():
     return FileResponse("frontend/index.html")
 
+@app.get("/stats")
+def stats():
+    orchestrator = get_orchestrator()
+    from agents.retriever_chroma import query_cache
+    return {
+        "query_embedding_cache": query_cache.stats(),
+        "answer_cache": orchestrator.answer_cache.stats(),
+        "active_sessions": len(orchestrator.sessions)
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Histogrammes par étape (route, retrieve, underspecified, llm, ...) au format Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/ask")
-def ask(query: str = Query(..., description="Question du patient")):
-    return generate_answer(query)
+async def ask(request: Request, response: Response,
+              query: str = Query(..., description="Question du patient")):
+    orchestrator = get_orchestrator()
+    session_id = get_session_id(request)
+    attach_session(response, session_id)
+    return await orchestrator.agenerate_answer(query, session_id)
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_stream(request: Request,
+                     query: str = Query(..., description="Question du patient")):
+    """Même réponse que /ask, envoyée token par token en Server-Sent Events."""
+    orchestrator = get_orchestrator()
+    session_id = get_session_id(request)
+
+    async def events():
+        try:
+            async for kind, value in orchestrator.astream_answer(query, session_id):
+                yield sse(kind, {kind: value})
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+        yield sse("done", {})
+
+    response = StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    attach_session(response, session_id)
+    return response
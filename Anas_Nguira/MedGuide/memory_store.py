@@ -0,0 +1,115 @@
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain.prompts import PromptTemplate
+from collections import OrderedDict
+import metrics
+import threading
+import time
+import os
+
+# ======================================================
+#  Paramètres (surchargeables via .env)
+# ======================================================
+SESSION_TOKEN_BUDGET = int(os.getenv("MEDGUIDE_SESSION_TOKEN_BUDGET", "800"))
+SESSION_TTL_SECONDS = float(os.getenv("MEDGUIDE_SESSION_TTL", "1800"))
+MAX_SESSIONS = int(os.getenv("MEDGUIDE_MAX_SESSIONS", "1000"))
+
+# ======================================================
+#  Résumé des anciens échanges (LLM dédié, pas le prompt médical)
+# ======================================================
+SUMMARY_SYSTEM_PROMPT = """
+                    Tu résumes une conversation entre un patient et un assistant médical.
+                    Tu ne donnes aucun avis médical et tu n ajoutes aucune information.
+                    Tu réponds uniquement par le résumé, en français, en quelques phrases.
+                    """
+
+summary_template = """
+Résumé actuel de la conversation :
+{summary}
+
+Nouveaux échanges :
+{new_lines}
+
+Complète le résumé avec les nouveaux échanges. Garde les symptômes, leur durée,
+les antécédents et les conseils déjà donnés.
+
+Nouveau résumé :
+"""
+
+summary_prompt = PromptTemplate(
+    input_variables=["summary", "new_lines"],
+    template=summary_template
+)
+
+
+class SessionMemoryStore:
+    """
+    Mémoire conversationnelle par session.
+    Chaque session garde ses derniers échanges dans la limite d'un budget de tokens ;
+    les échanges plus anciens sont résumés par `llm` (à créer avec SUMMARY_SYSTEM_PROMPT).
+    Les sessions inactives depuis plus de `ttl` secondes sont supprimées.
+    Les écritures d'une même session sont sérialisées (deux tours simultanés ne
+    résument pas les mêmes messages deux fois).
+    """
+
+    def __init__(self, llm, token_budget=SESSION_TOKEN_BUDGET,
+                 ttl=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS):
+        self.llm = llm
+        self.token_budget = token_budget
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> (memory, verrou, last_seen)
+        self._lock = threading.Lock()
+
+    def _new_memory(self):
+        return ConversationSummaryBufferMemory(
+            llm=self.llm,
+            max_token_limit=self.token_budget,
+            prompt=summary_prompt,
+            memory_key="chat_history",
+            input_key="question",
+            output_key="text"
+        )
+
+    def _evict(self, now):
+        # les sessions sont ordonnées de la moins récente à la plus récente
+        while self._sessions:
+            _, (_, _, last_seen) = next(iter(self._sessions.items()))
+            if now - last_seen <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def _entry(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.pop(session_id, None)
+            memory, lock = entry[:2] if entry else (self._new_memory(), threading.Lock())
+            self._sessions[session_id] = (memory, lock, now)
+            self._evict(now)
+            return memory, lock
+
+    def get(self, session_id):
+        return self._entry(session_id)[0]
+
+    def history(self, session_id):
+        return self.get(session_id).load_memory_variables({})["chat_history"]
+
+    def is_new(self, session_id):
+        """Vrai si la session n'a encore aucun échange (ni message, ni résumé)."""
+        memory = self.get(session_id)
+        return not memory.chat_memory.messages and not memory.moving_summary_buffer
+
+    def save(self, session_id, question, answer):
+        memory, lock = self._entry(session_id)
+        with lock:
+            # le résumé éventuel n'est pas facturé à la requête en cours
+            metrics.untraced(memory.save_context, {"question": question}, {"text": answer})
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._sessions)
@@ -0,0 +1,144 @@
+from contextvars import ContextVar, copy_context
+from contextlib import contextmanager
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger("medguide.metrics")
+
+SLOW_REQUEST_MS = float(os.getenv("MEDGUIDE_SLOW_REQUEST_MS", "5000"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+# ======================================================
+#  Histogramme au format texte Prometheus (sans dépendance)
+# ======================================================
+class Histogram:
+    def __init__(self, name, help_text, labelnames, buckets):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # valeurs des labels -> [compteurs par bucket, somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @staticmethod
+    def _labels(pairs):
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                base = list(zip(self.labelnames, key))
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{self._labels(base + [('le', bound)])} {c}")
+                lines.append(f"{self.name}_bucket{self._labels(base + [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{self._labels(base)} {total}")
+                lines.append(f"{self.name}_count{self._labels(base)} {count}")
+        return "\n".join(lines)
+
+
+stage_seconds = Histogram(
+    "medguide_stage_seconds", "Durée de chaque étape de generate_answer.",
+    ["stage", "specialty", "path"], LATENCY_BUCKETS
+)
+request_seconds = Histogram(
+    "medguide_request_seconds", "Durée totale de generate_answer.",
+    ["specialty", "path"], LATENCY_BUCKETS
+)
+prompt_tokens = Histogram(
+    "medguide_prompt_tokens", "Tokens du prompt envoyé au LLM.",
+    ["specialty", "path"], TOKEN_BUCKETS
+)
+completion_tokens = Histogram(
+    "medguide_completion_tokens", "Tokens générés par le LLM.",
+    ["specialty", "path"], TOKEN_BUCKETS
+)
+
+HISTOGRAMS = [request_seconds, stage_seconds, prompt_tokens, completion_tokens]
+
+
+# ======================================================
+#  Trace d'une requête : durées par étape + tokens
+# ======================================================
+class RequestTrace:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.stages = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.specialty = "unknown"
+        self.path = "unknown"
+
+    @contextmanager
+    def stage(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t
+
+    def add_tokens(self, prompt, completion):
+        self.prompt_tokens += prompt or 0
+        self.completion_tokens += completion or 0
+
+    def finish(self):
+        total = time.perf_counter() - self.t0
+        labels = {"specialty": self.specialty, "path": self.path}
+        request_seconds.observe(total, **labels)
+        for name, seconds in self.stages.items():
+            stage_seconds.observe(seconds, stage=name, **labels)
+        if self.prompt_tokens or self.completion_tokens:
+            prompt_tokens.observe(self.prompt_tokens, **labels)
+            completion_tokens.observe(self.completion_tokens, **labels)
+
+        if total * 1000 >= SLOW_REQUEST_MS:
+            breakdown = ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.stages.items())
+            logger.warning(
+                "requête lente %.0f ms [%s/%s] %s, tokens=%d+%d",
+                total * 1000, self.specialty, self.path, breakdown,
+                self.prompt_tokens, self.completion_tokens
+            )
+
+
+_current = ContextVar("medguide_trace", default=None)
+
+
+def start_trace():
+    trace = RequestTrace()
+    _current.set(trace)
+    return trace
+
+
+def untraced(fn, *args, **kwargs):
+    """Exécute fn hors de la trace courante : ses tokens ne sont pas comptés dans la requête."""
+    ctx = copy_context()
+    ctx.run(_current.set, None)
+    return ctx.run(fn, *args, **kwargs)
+
+
+def record_usage(usage):
+    """Appelé par EspritLLM avec l'objet `usage` renvoyé par l'API OpenAI."""
+    trace = _current.get()
+    if trace is not None and usage is not None:
+        trace.add_tokens(usage.prompt_tokens, usage.completion_tokens)
+
+
+def render():
+    return "\n".join(h.render() for h in HISTOGRAMS) + "\n"
@@ -1,9 +1,17 @@
-from langchain.memory import ConversationBufferMemory
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from llm_esprit import EspritLLM
-from agents.retriever_chroma import ChromaRetriever
+from agents.retrievers import build_retriever, RETRIEVER_BACKEND
+from agents.router import EmbeddingRouter, discover_specialties
+from agents.retriever_chroma import embed_query
+from memory_store import SessionMemoryStore, SUMMARY_SYSTEM_PROMPT
+from semantic_cache import SemanticAnswerCache
+import metrics
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+import asyncio
+import time
 import os
 
 # ======================================================
@@ -18,13 +26,17 @@ API_KEY = os.getenv("ESPRIT_API_KEY")
 llm = EspritLLM(api_key=API_KEY)
 
 # ======================================================
-#  Mémoire conversationnelle
+#  Mémoire conversationnelle (une par session, budget de tokens + TTL)
+#  Les anciens échanges sont résumés par un LLM sans le prompt médical
 # ======================================================
-memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    input_key="question",
-    return_messages=True
-)
+summary_llm = EspritLLM(api_key=API_KEY, system_prompt=SUMMARY_SYSTEM_PROMPT, temperature=0.2)
+sessions = SessionMemoryStore(summary_llm)
+DEFAULT_SESSION = "default"
+
+# ======================================================
+#  Cache sémantique des réponses (premiers tours uniquement)
+# ======================================================
+answer_cache = SemanticAnswerCache()
 
 # ======================================================
 #  Sous-agent CLARIFIER : quand la question est vague
@@ -58,8 +70,7 @@ clarifier_prompt = PromptTemplate(
 
 clarifier_chain = LLMChain(
     llm=llm,
-    prompt=clarifier_prompt,
-    memory=memory
+    prompt=clarifier_prompt
 )
 
 # ======================================================
@@ -87,27 +98,25 @@ doctor_prompt = PromptTemplate(
 
 doctor_chain = LLMChain(
     llm=llm,
-    prompt=doctor_prompt,
-    memory=memory
+    prompt=doctor_prompt
 )
 
 # ======================================================
-#  Initialisation des retrievers (Chroma)
+#  Initialisation des retrievers : un par dossier agents/<spécialité>/data
+#  (backend choisi par MEDGUIDE_RETRIEVER : chroma, faiss, bm25 ou hybrid)
 # ======================================================
-cardio = ChromaRetriever("cardio")
-neuro = ChromaRetriever("neuro")
+retrievers = {spec: build_retriever(spec, RETRIEVER_BACKEND) for spec in discover_specialties()}
 
 # ======================================================
-#  Routage vers la spécialité
+#  Routage vers la spécialité (centroïdes d'embeddings)
 # ======================================================
+router = EmbeddingRouter({spec: r.corpus_embeddings() for spec, r in retrievers.items()}, retrievers)
+
+# interrogation simultanée de toutes les spécialités pour les questions ambiguës
+retrieval_pool = ThreadPoolExecutor(max_workers=len(retrievers), thread_name_prefix="retrieval")
+
 def route_specialty(query):
-    q = query.lower()
-    if any(w in q for w in ["coeur", "cardiaque", "thorax", "infarctus", "palpitations"]):
-        return "cardio"
-    elif any(w in q for w in ["cerveau", "tête", "parole", "avc", "vertige", "engourdissement"]):
-        return "neuro"
-    else:
-        return "cardio"
+    return router.route(query)[0]
 
 # ======================================================
 #  Détection des requêtes floues
@@ -129,27 +138,186 @@ def is_underspecified(query: str, docs) -> bool:
 # ======================================================
 #  Fonction principale
 # ======================================================
-def generate_answer(query):
-    # Déterminer la spécialité
-    spec = route_specialty(query)
-    retriever = cardio if spec == "cardio" else neuro
+def _fan_out(query, vector, k=3):
+    """
+    Interroge toutes les collections en parallèle (durée = la plus lente, pas la somme),
+    fusionne les résultats par similarité cosinus avec `vector` (seul score comparable
+    d'une collection à l'autre) et choisit la spécialité la mieux étayée.
+    """
+    futures = {
+        spec: retrieval_pool.submit(r.dense_scored, query, k, vector)
+        for spec, r in retrievers.items()
+    }
+    merged = [(score, spec, doc) for spec, f in futures.items() for doc, score in f.result()]
+    merged.sort(key=lambda item: item[0], reverse=True)
+    top = merged[:k]
+
+    evidence = defaultdict(float)
+    for score, spec, _ in top:
+        evidence[spec] += score
+    best = max(evidence, key=evidence.get) if evidence else None
+    return best, [doc for _, _, doc in top]
+
 
-    # Récupération des documents contextuels
-    docs = retriever.retrieve(query)
+def _retrieve_context(query, spec, vector, ambiguous=False):
+    # Récupération des documents contextuels avec l'embedding déjà calculé par le routeur
+    if ambiguous:
+        best, docs = _fan_out(query, vector)
+        spec = best or spec
+    else:
+        docs = retrievers[spec].retrieve(query, query_embedding=vector)
     context = "\n".join(d for sublist in docs for d in (sublist if isinstance(sublist, list) else [sublist]))
+    return spec, docs, context
+
+
+def _cache_lookup(spec, vector, session_id):
+    """
+    Cache sémantique, uniquement pour le premier tour d'une session
+    (la réponse ne dépend alors d'aucun historique).
+    Retourne (clé, réponse en cache ou None) ; clé vaut None hors premier tour
+    ou quand la question n'a pas été encodée (routage BM25).
+    """
+    if vector is None or not sessions.is_new(session_id):
+        return None, None
+    return (spec, vector), answer_cache.lookup(spec, vector)
+
+
+def _cache_store(cache_key, result):
+    if cache_key is not None:
+        answer_cache.store(cache_key[0], cache_key[1], result)
+
+
+def _prepare(trace, query, session_id):
+    """
+    Étapes avant le LLM, communes aux trois variantes (sync, async, streaming) :
+    routage, cache sémantique, recherche, historique, détection des questions floues.
+    Retourne un dict : "cached" (réponse en cache ou None), "cache_key", "label"
+    (spécialité ou "clarifier"), "chain" / "prompt" et leurs "inputs".
+    """
+    # Déterminer la spécialité (la question n'est encodée qu'une fois)
+    with trace.stage("route"):
+        spec, vector, ambiguous = router.route(query)
+    trace.specialty = spec
+
+    with trace.stage("cache"):
+        cache_key, cached = _cache_lookup(spec, vector, session_id)
+    if cached:
+        trace.path = "cache"
+        return {"cached": cached, "cache_key": None}
 
+    # Récupération des documents avec l'embedding déjà calculé par le routeur
+    with trace.stage("retrieve"):
+        spec, docs, context = _retrieve_context(query, spec, vector, ambiguous)
+    trace.specialty = spec
+
+    with trace.stage("memory"):
+        history = sessions.history(session_id)
 
     # Vérifie si la question est floue
-    if is_underspecified(query, docs):
-        clarif = clarifier_chain.invoke({"question": query})
-        return {"specialty": "clarifier", "answer": clarif["text"]}
+    with trace.stage("underspecified"):
+        vague = is_underspecified(query, docs)
+
+    if vague:
+        trace.path = "clarifier"
+        return {
+            "cached": None, "cache_key": cache_key, "label": "clarifier",
+            "chain": clarifier_chain, "prompt": clarifier_prompt,
+            "inputs": {"question": query, "chat_history": history},
+        }
 
     # Sinon : réponse médicale normale
-    answer = doctor_chain.invoke({
-        "specialty": spec,
-        "specialty_cap": spec.capitalize(),
-        "context": context,
-        "question": query
-    })
-
-    return {"specialty": spec, "answer": answer["text"]}
+    trace.path = "doctor"
+    return {
+        "cached": None, "cache_key": cache_key, "label": spec,
+        "chain": doctor_chain, "prompt": doctor_prompt,
+        "inputs": {
+            "specialty": spec,
+            "specialty_cap": spec.capitalize(),
+            "context": context,
+            "question": query,
+            "chat_history": history
+        },
+    }
+
+
+def _remember(trace, session_id, query, result, cache_key):
+    """Après le LLM : échange ajouté à la mémoire de session, réponse mise en cache."""
+    # le résumé des anciens échanges peut appeler le LLM (appelé dans un thread en async)
+    with trace.stage("memory"):
+        sessions.save(session_id, query, result["answer"])
+    _cache_store(cache_key, result)
+
+
+def generate_answer(query, session_id=DEFAULT_SESSION):
+    trace = metrics.start_trace()
+    try:
+        turn = _prepare(trace, query, session_id)
+        if turn["cached"]:
+            result = dict(turn["cached"])
+        else:
+            with trace.stage("llm"):
+                output = turn["chain"].invoke(turn["inputs"])
+            result = {"specialty": turn["label"], "answer": output["text"]}
+        _remember(trace, session_id, query, result, turn["cache_key"])
+        return result
+    finally:
+        trace.finish()
+
+
+async def agenerate_answer(query, session_id=DEFAULT_SESSION):
+    """Version asynchrone : routage, recherche et mémoire dans un thread, le LLM est attendu sans bloquer."""
+    trace = metrics.start_trace()
+    try:
+        turn = await asyncio.to_thread(_prepare, trace, query, session_id)
+        if turn["cached"]:
+            result = dict(turn["cached"])
+        else:
+            with trace.stage("llm"):
+                output = await turn["chain"].ainvoke(turn["inputs"])
+            result = {"specialty": turn["label"], "answer": output["text"]}
+        await asyncio.to_thread(_remember, trace, session_id, query, result, turn["cache_key"])
+        return result
+    finally:
+        trace.finish()
+
+
+async def astream_answer(query, session_id=DEFAULT_SESSION):
+    """
+    Version streaming : produit d'abord ("specialty", spec) puis ("token", texte)
+    au fur et à mesure de la génération du LLM.
+    """
+    trace = metrics.start_trace()
+    try:
+        turn = await asyncio.to_thread(_prepare, trace, query, session_id)
+        if turn["cached"]:
+            cached = turn["cached"]
+            yield "specialty", cached["specialty"]
+            yield "token", cached["answer"]
+            result = dict(cached)
+        else:
+            yield "specialty", turn["label"]
+
+            parts = []
+            with trace.stage("llm"):
+                async for token in llm.astream(turn["prompt"].format(**turn["inputs"])):
+                    if not parts:
+                        trace.stages["first_token"] = time.perf_counter() - trace.t0
+                    parts.append(token)
+                    yield "token", token
+            result = {"specialty": turn["label"], "answer": "".join(parts)}
+
+        await asyncio.to_thread(_remember, trace, session_id, query, result, turn["cache_key"])
+    finally:
+        trace.finish()
+
+
+# ======================================================
+#  Préchauffage (appelé au démarrage par startup.py)
+# ======================================================
+WARMUP_QUERY = "douleur thoracique et vertiges depuis ce matin"
+
+def warmup():
+    """Encode une question factice puis interroge chaque index une fois."""
+    vector = embed_query(WARMUP_QUERY)
+    for retriever in retrievers.values():
+        retriever.retrieve_scored(WARMUP_QUERY, k=1, query_embedding=vector)
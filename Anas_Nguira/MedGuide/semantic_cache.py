@@ -0,0 +1,102 @@
+from collections import OrderedDict
+import numpy as np
+import threading
+import time
+import os
+
+# ======================================================
+#  Paramètres (surchargeables via .env)
+# ======================================================
+ANSWER_CACHE_THRESHOLD = float(os.getenv("MEDGUIDE_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("MEDGUIDE_ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_SIZE = int(os.getenv("MEDGUIDE_ANSWER_CACHE_SIZE", "500"))
+
+
+class SemanticAnswerCache:
+    """
+    Cache de réponses par spécialité, indexé par l'embedding de la question.
+    Une question dont la similarité cosinus avec une question déjà traitée
+    dépasse `threshold` reçoit la même réponse sans appel au LLM.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL,
+                 maxsize=ANSWER_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # specialty -> OrderedDict(id -> (vecteur normalisé, réponse, date))
+        self._size = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _purge(self, now):
+        for entries in self._entries.values():
+            expired = [k for k, (_, _, t) in entries.items() if now - t > self.ttl]
+            for k in expired:
+                del entries[k]
+                self._size -= 1
+
+    def _evict_lru(self):
+        # l'entrée la moins récemment utilisée, toutes spécialités confondues
+        oldest = None
+        for spec, entries in self._entries.items():
+            if entries:
+                key = next(iter(entries))
+                if oldest is None or key < oldest[1]:
+                    oldest = (spec, key)
+        if oldest:
+            del self._entries[oldest[0]][oldest[1]]
+            self._size -= 1
+
+    def lookup(self, specialty, vector):
+        q = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            entries = self._entries.get(specialty)
+            if entries:
+                keys = list(entries.keys())
+                matrix = np.stack([entries[k][0] for k in keys])
+                scores = matrix @ q
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = keys[best]
+                    vec, answer, created = entries.pop(key)
+                    # ré-insertion avec un nouvel identifiant : devient la plus récente
+                    self._next_id += 1
+                    entries[self._next_id] = (vec, answer, created)
+                    self.hits += 1
+                    return answer
+            self.misses += 1
+            return None
+
+    def store(self, specialty, vector, answer):
+        with self._lock:
+            self._next_id += 1
+            self._entries.setdefault(specialty, OrderedDict())[self._next_id] = (
+                self._normalize(vector), answer, time.monotonic()
+            )
+            self._size += 1
+            while self._size > self.maxsize:
+                self._evict_lru()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": self._size,
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
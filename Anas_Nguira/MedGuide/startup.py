@@ -0,0 +1,66 @@
+import importlib
+import threading
+import logging
+import time
+
+logger = logging.getLogger("medguide.startup")
+
+# ======================================================
+#  État de démarrage partagé par main.py (/healthz, /readyz)
+# ======================================================
+state = {
+    "ready": False,
+    "error": None,
+    "started_at": None,
+    "timings_ms": {},
+}
+_lock = threading.Lock()
+_thread = None
+_orchestrator = None
+
+# imports lourds mesurés un par un pour repérer les régressions de démarrage à froid
+HEAVY_IMPORTS = ["langchain.chains", "chromadb", "sentence_transformers"]
+
+
+def _timed(step, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = round((time.perf_counter() - t0) * 1000, 1)
+    state["timings_ms"][step] = elapsed
+    logger.info("startup %s : %.1f ms", step, elapsed)
+    return result
+
+
+def _warm_up():
+    global _orchestrator
+    state["started_at"] = time.time()
+    t0 = time.perf_counter()
+    try:
+        for module in HEAVY_IMPORTS:
+            _timed(f"import {module}", lambda: importlib.import_module(module))
+        # modèle d'embedding, clients Chroma, retrievers, routeur
+        orchestrator = _timed("import orchestrator", lambda: importlib.import_module("orchestrator"))
+        # question factice : encodeur chargé et pages de l'index HNSW touchées
+        _timed("warmup", orchestrator.warmup)
+        _orchestrator = orchestrator
+        state["ready"] = True
+    except Exception as e:
+        logger.exception("échec du démarrage")
+        state["error"] = f"{type(e).__name__}: {e}"
+    state["timings_ms"]["total"] = round((time.perf_counter() - t0) * 1000, 1)
+    if state["ready"]:
+        print(f"🔥 MedGuide prêt en {state['timings_ms']['total']} ms : {state['timings_ms']}")
+
+
+def start_in_background():
+    """Lance le chargement des modèles dans un thread : le serveur répond tout de suite."""
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_warm_up, name="medguide-warmup", daemon=True)
+            _thread.start()
+
+
+def get_orchestrator():
+    """Module orchestrator une fois prêt, sinon None."""
+    return _orchestrator
@@ -0,0 +1,124 @@
+from langchain.vectorstores import FAISS
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+import numpy as np
+import hashlib
+import pickle
+import faiss
+import json
+import time
+import os
+
+ARTICLES_DIR = "articles"
+INDEX_DIR = os.getenv("REPORT_INDEX_DIR", "article_index")
+
+INDEX_FILE = "index.faiss"      # IndexIDMap2(IndexFlatL2) : un id stable par chunk
+CHUNKS_FILE = "chunks.pkl"      # id -> Document
+MANIFEST_FILE = "manifest.json" # article -> {sha256, ids}, + prochain id libre
+
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_articles(articles_dir):
+    """Chemins relatifs de tous les PDF sous articles/, dans un ordre stable."""
+    found = []
+    for root, dirs, files in os.walk(articles_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                found.append(os.path.relpath(os.path.join(root, name), articles_dir))
+    return found
+
+
+def _write_atomic(path, write, mode="wb"):
+    """Écrit dans un fichier temporaire puis le renomme : jamais d'index à moitié écrit."""
+    tmp = path + ".tmp"
+    with open(tmp, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _load(index_dir, mmap):
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(os.path.join(index_dir, INDEX_FILE), flags)
+    with open(os.path.join(index_dir, CHUNKS_FILE), "rb") as f:
+        chunks = pickle.load(f)
+    return index, chunks
+
+
+def _update(index, chunks, manifest, articles_dir, embeddings, changed, removed):
+    """Retire les chunks des articles modifiés/supprimés puis ré-embedde seulement les modifiés/ajoutés."""
+    stale = [i for path in changed + removed if path in manifest["articles"] for i in manifest["articles"][path]["ids"]]
+    if stale:
+        index.remove_ids(np.asarray(stale, dtype=np.int64))
+        for i in stale:
+            del chunks[i]
+    for path in removed:
+        del manifest["articles"][path]
+
+    for path in changed:
+        full = os.path.join(articles_dir, path)
+        texts = text_splitter.split_documents(PyPDFLoader(full).load())
+        ids = list(range(manifest["next_id"], manifest["next_id"] + len(texts)))
+        manifest["next_id"] += len(texts)
+        if texts:
+            vectors = np.asarray(embeddings.embed_documents([t.page_content for t in texts]), dtype=np.float32)
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+            index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+            chunks.update(zip(ids, texts))
+        manifest["articles"][path] = {"sha256": file_sha256(full), "ids": ids}
+        print(f"   📄 {path} : {len(texts)} chunks")
+    return index
+
+
+def load_article_index(embeddings, articles_dir=ARTICLES_DIR, index_dir=INDEX_DIR):
+    """
+    Index FAISS des articles, persistant : si aucun PDF n'a changé depuis la dernière
+    fois (manifest des sha256), l'index est memory-mappé tel quel ; sinon seuls les PDF
+    ajoutés ou modifiés sont ré-embeddés, les supprimés sont retirés, puis l'index est
+    réécrit et rechargé en mmap. Renvoie un vectorstore FAISS de LangChain.
+    """
+    t0 = time.perf_counter()
+    os.makedirs(index_dir, exist_ok=True)
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    manifest = {"next_id": 0, "articles": {}}
+    if os.path.exists(manifest_path) and os.path.exists(os.path.join(index_dir, INDEX_FILE)):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    current = list_articles(articles_dir)
+    changed = [p for p in current
+               if manifest["articles"].get(p, {}).get("sha256") != file_sha256(os.path.join(articles_dir, p))]
+    removed = [p for p in manifest["articles"] if p not in current]
+
+    if changed or removed:
+        print(f"🔄 Index des articles : {len(changed)} ajouté(s)/modifié(s), {len(removed)} supprimé(s)")
+        index, chunks = _load(index_dir, mmap=False) if manifest["articles"] else (None, {})
+        index = _update(index, chunks, manifest, articles_dir, embeddings, changed, removed)
+        if index is None:
+            raise RuntimeError(f"Aucun article PDF à indexer dans {articles_dir}/")
+        _write_atomic(os.path.join(index_dir, INDEX_FILE),
+                      lambda f: f.write(faiss.serialize_index(index).tobytes()))
+        _write_atomic(os.path.join(index_dir, CHUNKS_FILE), lambda f: pickle.dump(chunks, f))
+        _write_atomic(manifest_path, lambda f: json.dump(manifest, f, indent=2), mode="w")
+
+    index, chunks = _load(index_dir, mmap=True)
+    print(f"✅ Index des articles prêt : {index.ntotal} chunks en {time.perf_counter() - t0:.2f}s")
+
+    # les ids FAISS servent directement de clés du docstore
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore({str(i): doc for i, doc in chunks.items()}),
+        index_to_docstore_id={i: str(i) for i in chunks},
+    )
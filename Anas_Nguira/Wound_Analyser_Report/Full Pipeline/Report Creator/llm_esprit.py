@@ -1,36 +1,79 @@
 import httpx
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from langchain.llms.base import LLM
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
 from typing import Optional, List, Any
 from dotenv import load_dotenv
+import threading
 import os
 
+load_dotenv()  # charge le fichier .env une seule fois au démarrage
 
+# ======================================================
+#  Pool de connexions HTTP partagé par tout le processus
+# ======================================================
+HTTP_MAX_CONNECTIONS = int(os.getenv("ESPRIT_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("ESPRIT_HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("ESPRIT_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("ESPRIT_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("ESPRIT_HTTP_READ_TIMEOUT", "120"))
 
-class EspritLLM(LLM):
-    """LLM wrapper compatible LangChain pour le modèle hébergé à Esprit."""
+_clients = {}
+_clients_lock = threading.Lock()
 
-    model: str = "hosted_vllm/Llama-3.1-70B-Instruct"
-    temperature: float = 0.7
-    max_tokens: int = 500
-    top_p: float = 0.9
-    api_key: str = ""
-    base_url: str = "https://tokenfactory.esprit.tn/api"
 
-    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
-        http_client = httpx.Client(verify=False)
-        load_dotenv()  # charge automatiquement le fichier .env
-        api_key = os.getenv("ESPRIT_API_KEY")
-        client = OpenAI(
-            api_key=api_key,
-            base_url=self.base_url,
-            http_client=http_client
-        )
+def _http_options() -> dict:
+    return {
+        "verify": False,
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    }
 
-        response = client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": f"""
+
+def get_client(api_key: str, base_url: str, asynchronous: bool = False):
+    """
+    Retourne le client OpenAI (sync ou async) partagé pour ce couple clé / URL :
+    les rapports concurrents réutilisent les mêmes connexions TLS.
+    """
+    key = (api_key, base_url, asynchronous)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                if asynchronous:
+                    client = AsyncOpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=httpx.AsyncClient(**_http_options())
+                    )
+                else:
+                    client = OpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=httpx.Client(**_http_options())
+                    )
+                _clients[key] = client
+    return client
+
+
+async def aclose_clients():
+    """Ferme proprement les pools de connexions (à appeler à l'arrêt de l'app)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        if isinstance(client, AsyncOpenAI):
+            await client.close()
+        else:
+            client.close()
+
+
+SYSTEM_PROMPT = """
                     Tu es un agent médical tunisien spécialisé.
                     Ta mission est d analyser les informations du patient selon ta spécialité
                     et de formuler des recommandations informatives, sécurisées et professionnelles.
@@ -49,7 +92,45 @@ class EspritLLM(LLM):
                     - Questions à poser si nécessaire
                     - Recommandation générale (sans remplacer un médecin)
                     """
-                    },
+
+class EspritLLM(LLM):
+    """LLM wrapper compatible LangChain pour le modèle hébergé à Esprit."""
+
+    model: str = "hosted_vllm/Llama-3.1-70B-Instruct"
+    temperature: float = 0.7
+    max_tokens: int = 500
+    top_p: float = 0.9
+    api_key: str = ""
+    base_url: str = "https://tokenfactory.esprit.tn/api"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+        client = get_client(os.getenv("ESPRIT_API_KEY"), self.base_url)
+
+        response = client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            top_p=self.top_p
+        )
+        return response.choices[0].message.content
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Même requête que _call, sans bloquer la boucle asyncio."""
+        client = get_client(os.getenv("ESPRIT_API_KEY"), self.base_url, asynchronous=True)
+        response = await client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=self.temperature,
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+import hashlib
+import math
+import asyncio
+import json
+import time
+import os
+
+CACHE_BIN = float(os.getenv("REPORT_CACHE_BIN", "2"))          # largeur des classes, en points de %
+CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))        # entrées en mémoire
+CACHE_DISK_MAX = int(os.getenv("REPORT_CACHE_DISK_MAX", "5000"))
+CACHE_DIR = os.getenv("REPORT_CACHE_DIR", "narrative_cache")
+
+
+class NarrativeCache:
+    """
+    Texte clinique du rapport, réutilisé pour des compositions de plaie quasi identiques.
+    La clé est l'analyse (% de chaque tissu) arrondie à `bin` points près, plus `version`
+    (prompt + modèle) : changer le prompt invalide tout. Le LLM reçoit lui aussi les
+    valeurs arrondies (et la largeur `bin`), donc le texte en cache est exact pour toute
+    la classe ; un tissu présent mais sous bin/2 est arrondi à bin/2, jamais à 0.
+
+    Deux niveaux : LRU en mémoire (`maxsize`) puis un fichier JSON par clé sur disque
+    (`disk_max` fichiers au plus), tous deux limités à `ttl` secondes. Les générations
+    simultanées d'une même clé sont fusionnées ; un échec du LLM ou un texte vide n'est
+    jamais mis en cache.
+    """
+
+    def __init__(self, version, bin=CACHE_BIN, ttl=CACHE_TTL, maxsize=CACHE_SIZE,
+                 directory=CACHE_DIR, disk_max=CACHE_DISK_MAX):
+        self.version = version
+        self.bin = bin
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.directory = directory
+        self.disk_max = disk_max
+        self.memory = OrderedDict()   # clé -> (créé à, texte)
+        self.inflight = {}
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.hits_inflight = 0
+        self.disk_errors = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def quantise(self, analysis):
+        if self.bin <= 0:
+            return dict(sorted(analysis.items()))
+        return {name: self._round(float(v)) for name, v in sorted(analysis.items())}
+
+    def _round(self, v):
+        # arrondi au plus proche, moitié vers le haut (round() arrondit 2.5 à 2)
+        q = math.floor(v / self.bin + 0.5) * self.bin
+        if v > 0 and q == 0:
+            q = self.bin / 2  # un tissu présent (0.99 %) ne devient pas 0 % pour le LLM
+        return round(q, 2)
+
+    def key(self, quantised):
+        raw = json.dumps({"v": self.version, "b": self.bin, "a": quantised}, sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    async def get(self, analysis, generate):
+        """Texte pour `analysis` ; sinon `await generate(analyse arrondie)`, mis en cache."""
+        quantised = self.quantise(analysis)
+        key = self.key(quantised)
+
+        entry = self.memory.get(key)
+        if entry and time.time() - entry[0] <= self.ttl:
+            self.memory.move_to_end(key)
+            self.hits_memory += 1
+            return entry[1]
+
+        entry = await asyncio.to_thread(self._read, key)
+        if entry:
+            self._remember(key, entry)
+            self.hits_disk += 1
+            return entry[1]
+
+        if key in self.inflight:
+            # même texte déjà en cours de génération : compté comme un hit (pas d'appel LLM en plus)
+            self.hits_inflight += 1
+            return await asyncio.shield(self.inflight[key])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            text = await generate(quantised)
+            if not text or not text.strip():
+                raise ValueError("texte vide renvoyé par le LLM")
+            entry = (time.time(), text)
+            self._remember(key, entry)
+            future.set_result(text)
+            try:
+                await asyncio.to_thread(self._write, key, quantised, entry)
+            except OSError as e:
+                # disque plein, droits... : le texte reste servi et en mémoire
+                self.disk_errors += 1
+                print(f"⚠️ Cache des textes : écriture sur disque impossible ({e})")
+            return text
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            del self.inflight[key]
+            if not future.done():
+                # appelant annulé (client parti, arrêt) : les requêtes en attente ne restent pas bloquées
+                future.set_exception(RuntimeError("génération du texte annulée"))
+            future.exception()  # erreur marquée comme lue même sans autre requête en attente
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key):
+        """Entrée sur disque, ou None : fichier absent, supprimé entre-temps par _prune, tronqué ou d'un ancien format."""
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                data = json.load(f)
+            created, text = float(data["created"]), data["text"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if time.time() - created > self.ttl or not isinstance(text, str) or not text.strip():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return created, text
+
+    def _write(self, key, quantised, entry):
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"created": entry[0], "analysis": quantised, "text": entry[1]}, f, ensure_ascii=False)
+        os.replace(tmp, self._path(key))
+        self._prune()
+
+    def _prune(self):
+        """Au-delà de `disk_max` fichiers, supprime les plus anciens."""
+        files = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        if len(files) <= self.disk_max:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for e in files[:len(files) - self.disk_max]:
+            try:
+                os.remove(e.path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        hits = self.hits_memory + self.hits_disk + self.hits_inflight
+        lookups = hits + self.misses
+        return {
+            "bin_percent": self.bin,
+            "memory_entries": len(self.memory),
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "hits_inflight": self.hits_inflight,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "disk_errors": self.disk_errors,
+        }
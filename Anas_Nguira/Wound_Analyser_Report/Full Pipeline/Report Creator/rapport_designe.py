@@ -5,11 +5,18 @@ from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
-import json
-import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import multiprocessing
+import asyncio
+import json
+import io
 import os
 
+# rendu reportlab (CPU, bloquant) dans des processus séparés : les rapports concurrents avancent en parallèle
+PDF_WORKERS = int(os.getenv("REPORT_PDF_WORKERS", "2"))
+_pdf_pool = None
+
 # Styles (une seule fois au démarrage)
 styles = getSampleStyleSheet()
 styles.add(ParagraphStyle(name='TitleBlue', fontSize=26, leading=32, textColor=colors.HexColor("#1d4ed8"), alignment=TA_CENTER, spaceAfter=20))
@@ -18,18 +25,79 @@ styles.add(ParagraphStyle(name='Header', fontSize=14, leading=18, textColor=colo
 styles.add(ParagraphStyle(name='Body', fontSize=11, leading=16, spaceAfter=12))
 
 
+def _ready():
+    return True
+
+
+async def start_pdf_pool():
+    """
+    Crée le pool au démarrage de l'app (pas à la première requête) avec le mode « spawn » :
+    un fork du processus serveur (threads httpx/asyncio, modèle d'embeddings, torch en
+    mode inprocess) pourrait se bloquer. Chaque worker ré-importe le script principal :
+    son import doit rester sans effet (modèles et index chargés dans startup, cf. test2.py).
+    """
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        # démarrage des processus ici plutôt que sur le premier rapport
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(_pdf_pool, _ready) for _ in range(PDF_WORKERS)))
+
+
+def get_pdf_pool():
+    if _pdf_pool is None:
+        raise RuntimeError("Pool PDF non démarré : appeler start_pdf_pool() au démarrage de l'app")
+    return _pdf_pool
+
+
+async def shutdown_pdf_pool():
+    """Attend la fin des workers (sans quoi ils meurent avec l'interpréteur), hors de la boucle asyncio."""
+    global _pdf_pool
+    if _pdf_pool is not None:
+        pool, _pdf_pool = _pdf_pool, None
+        await asyncio.to_thread(pool.shutdown, cancel_futures=True)
+
+
 # === FONCTION DE RAPPORT BEAU (corrigée) ===
 async def generate_beautiful_report(
     analysis_json: dict,
     original_filename: str,
     report_chain,
-    original_image_path: str
-) -> str:
-    report_id = uuid.uuid4().hex[:8]
-    pdf_path = f"rapport_dermatologie_{report_id}.pdf"
+    original_image: bytes,
+    narratives=None
+) -> bytes:
+    """
+    Texte clinique via l'API async du LLM (ou le cache `narratives`, voir narrative_cache.py),
+    puis PDF rendu dans le pool de processus : octets du PDF.
+    """
+    async def write(analysis):
+        return await report_chain.ainvoke({
+            "analysis_json": json.dumps(analysis, indent=2, ensure_ascii=False)
+        })
+
+    try:
+        if narratives is None:
+            report_text = await write(analysis_json)
+        else:
+            # seuls les pourcentages (arrondis) comptent pour le texte
+            report_text = await narratives.get(
+                analysis_json["analysis"],
+                lambda quantised: write({"analysis": quantised, "rounded_to_percent_points": narratives.bin})
+            )
+    except Exception:
+        report_text = "Analyse clinique en cours de génération..."
+
+    generated_at = datetime.now().strftime('%d/%m/%Y à %H:%M:%S')
+    return await asyncio.get_running_loop().run_in_executor(
+        get_pdf_pool(), render_pdf, analysis_json, original_filename, report_text, original_image, generated_at
+    )
 
+
+def render_pdf(analysis_json, original_filename, report_text, original_image, generated_at) -> bytes:
+    """Mise en page reportlab, entièrement en mémoire (aucun fichier écrit)."""
+    buffer = io.BytesIO()
     doc = SimpleDocTemplate(
-        pdf_path,
+        buffer,
         pagesize=A4,
         rightMargin=2*cm,
         leftMargin=2*cm,
@@ -42,7 +110,7 @@ async def generate_beautiful_report(
     story.append(Paragraph("Service de Dermatologie Numérique", styles['TitleBlue']))
     story.append(Paragraph("Rapport d'analyse automatisée de plaie", styles['Subtitle']))
     story.append(Spacer(1, 20))
-    story.append(Paragraph(f"<b>Date :</b> {datetime.now().strftime('%d/%m/%Y à %H:%M:%S')}", styles['Body']))
+    story.append(Paragraph(f"<b>Date :</b> {generated_at}", styles['Body']))
     story.append(Paragraph(f"<b>Fichier analysé :</b> {original_filename}", styles['Body']))
     story.append(Spacer(1, 30))
 
@@ -71,13 +139,6 @@ async def generate_beautiful_report(
     story.append(Spacer(1, 30))
 
     # === ANALYSE CLINIQUE IA ===
-    try:
-        report_text = report_chain.invoke({
-            "analysis_json": json.dumps(analysis_json, indent=2, ensure_ascii=False)
-        })
-    except:
-        report_text = "Analyse clinique en cours de génération..."
-
     story.append(Paragraph("<b>Analyse clinique détaillée :</b>", styles['Header']))
     for para in report_text.split('\n\n'):
         if para.strip():
@@ -88,10 +149,10 @@ async def generate_beautiful_report(
     story.append(Paragraph("<b>Image de la plaie analysée :</b>", styles['Header']))
     story.append(Spacer(1, 15))
 
-    if os.path.exists(original_image_path):
+    if original_image:
         try:
-            # Image centrée, belle taille
-            img = RLImage(original_image_path, width=14*cm, height=14*cm)
+            # Image centrée, belle taille (lue directement depuis les octets reçus)
+            img = RLImage(io.BytesIO(original_image), width=14*cm, height=14*cm)
             img.hAlign = 'CENTER'
             story.append(img)
         except Exception as e:
@@ -107,4 +168,4 @@ async def generate_beautiful_report(
 
     # Génération du PDF
     doc.build(story)
-    return pdf_path
\ No newline at end of file
+    return buffer.getvalue()
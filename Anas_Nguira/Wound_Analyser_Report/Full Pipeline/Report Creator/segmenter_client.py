@@ -0,0 +1,72 @@
+import importlib.util
+import httpx
+import sys
+import os
+
+# http      : POST vers le service Wound Analyser (client partagé, connexions réutilisées)
+# inprocess : le modèle du Wound Analyser est chargé dans ce processus, appel direct
+SEGMENTER = os.getenv("REPORT_SEGMENTER", "http")
+WOUND_URL = os.getenv("REPORT_WOUND_URL", "http://localhost:8000/predict")
+WOUND_DIR = os.getenv("REPORT_WOUND_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Wound Analyser"))
+TIMEOUT = float(os.getenv("REPORT_WOUND_TIMEOUT", "120"))
+MAX_CONNECTIONS = int(os.getenv("REPORT_WOUND_MAX_CONNECTIONS", "20"))
+
+
+class HttpSegmenter:
+    """Un seul AsyncClient pour toute la vie de l'app ; l'image part directement de la mémoire."""
+
+    def __init__(self, url):
+        self.url = url
+        self.client = None
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        )
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+
+    async def predict(self, data, filename, content_type):
+        resp = await self.client.post(self.url, files={"file": (filename, data, content_type)})
+        if resp.status_code != 200:
+            raise Exception(f"Erreur modèle ({resp.status_code})")
+        return resp.json()
+
+
+class InProcessSegmenter:
+    """
+    Importe Wound Analyser/main.py (modèle, pool, micro-batcher, cache) et appelle
+    analyze() sans passer par HTTP. Les chemins relatifs du service sont résolus
+    par rapport à son propre dossier.
+    """
+
+    def __init__(self, wound_dir):
+        wound_dir = os.path.abspath(wound_dir)
+        os.environ.setdefault("WOUND_MODEL_PATH", os.path.join(wound_dir, "best_multiclass_model.pth"))
+        os.environ.setdefault("WOUND_ONNX_MODEL", os.path.join(wound_dir, "best_multiclass_model.onnx"))
+        os.environ.setdefault("WOUND_STATIC_DIR", os.path.join(wound_dir, "static"))
+        sys.path.insert(0, wound_dir)
+        spec = importlib.util.spec_from_file_location("wound_analyser", os.path.join(wound_dir, "main.py"))
+        self.wound = importlib.util.module_from_spec(spec)
+        sys.modules["wound_analyser"] = self.wound
+        spec.loader.exec_module(self.wound)
+
+    async def start(self):
+        await self.wound.startup()
+
+    async def close(self):
+        await self.wound.shutdown()
+
+    async def predict(self, data, filename, content_type):
+        _, stats, _, cached = await self.wound.analyze(data, "fast")
+        return {"original": filename, "analysis": stats, "mode": "fast", "cached": cached}
+
+
+def build_segmenter():
+    if SEGMENTER == "inprocess":
+        print(f"🔗 Segmentation dans le processus ({WOUND_DIR})")
+        return InProcessSegmenter(WOUND_DIR)
+    return HttpSegmenter(WOUND_URL)
@@ -1,49 +1,30 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import Response, JSONResponse
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
-from langchain.vectorstores import FAISS  # Or use your preferred vectorstore
 from langchain.embeddings import HuggingFaceEmbeddings  # Assuming open-source embeddings
-from langchain.document_loaders import DirectoryLoader, PyPDFLoader  # Adjust for your article formats
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-import httpx
 import json
-import os
 from typing import Dict
 from pydantic import BaseModel
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from datetime import datetime
 from datetime import datetime  # CELLE-CI MANQUAIT !
-import uuid
 import time   # <--- IMPORTANT : ajouté
 from fastapi import BackgroundTasks
-from rapport_designe import generate_beautiful_report
+from rapport_designe import generate_beautiful_report, start_pdf_pool, shutdown_pdf_pool
+from article_index import load_article_index
+from segmenter_client import build_segmenter
+from narrative_cache import NarrativeCache
 
 # Import your EspritLLM
-from llm_esprit import EspritLLM  # Replace with the actual module where EspritLLM is defined
+from llm_esprit import EspritLLM, aclose_clients  # Replace with the actual module where EspritLLM is defined
 
 app = FastAPI()
 
-# Setup embeddings (using open-source, since your LLM is university-hosted)
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-# Load articles for RAG (assume articles are in a directory 'articles/' with PDFs or text files)
-# You can adjust the loader based on your file types
-loader = DirectoryLoader("articles/", glob="**/*.pdf", loader_cls=PyPDFLoader)  # Or TextLoader for txt
-documents = loader.load()
-
-# Split documents
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-texts = text_splitter.split_documents(documents)
-
-# Create vectorstore (FAISS for local, or use Pinecone/Chroma if cloud)
-vectorstore = FAISS.from_documents(texts, embeddings)
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})  # Retrieve top 3 relevant docs
-
 # Initialize LLM
 llm = EspritLLM(temperature=0.25, max_tokens=500, top_p=0.9)
 
@@ -57,13 +38,6 @@ rag_prompt = ChatPromptTemplate.from_messages([
     ("human", "{question}")
 ])
 
-rag_chain = (
-    {"context": retriever, "question": RunnablePassthrough(), "chat_history": lambda x: memory.chat_memory.messages}
-    | rag_prompt
-    | llm
-    | StrOutputParser()
-)
-
 # For image analysis to report generation
 report_prompt = ChatPromptTemplate.from_template(
     """Based on the following image analysis JSON, generate a detailed dermatological report:
@@ -78,6 +52,46 @@ report_prompt = ChatPromptTemplate.from_template(
 
 report_chain = report_prompt | llm | StrOutputParser()
 
+# Construits au démarrage (startup), pas à l'import : les workers PDF (mode spawn)
+# ré-importent ce module et ne doivent ni charger les modèles ni toucher aux index
+rag_chain = None
+narratives = None
+segmenter = None
+
+@app.on_event("startup")
+async def startup():
+    global rag_chain, narratives, segmenter
+
+    # Setup embeddings (using open-source, since your LLM is university-hosted)
+    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+    # Index FAISS des articles (articles/*.pdf), persisté dans article_index/ :
+    # memory-mappé au démarrage, seuls les PDF ajoutés/modifiés sont ré-embeddés
+    vectorstore = load_article_index(embeddings)
+    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})  # Retrieve top 3 relevant docs
+
+    rag_chain = (
+        {"context": retriever, "question": RunnablePassthrough(), "chat_history": lambda x: memory.chat_memory.messages}
+        | rag_prompt
+        | llm
+        | StrOutputParser()
+    )
+
+    # Texte clinique réutilisé pour des compositions de tissus quasi identiques (REPORT_CACHE_BIN %)
+    narratives = NarrativeCache(version=f"{llm.model}|{report_prompt.messages[0].prompt.template}")
+
+    # Segmentation : client HTTP partagé (ou modèle chargé dans ce processus, REPORT_SEGMENTER=inprocess)
+    segmenter = build_segmenter()
+    await segmenter.start()
+    await start_pdf_pool()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if segmenter is not None:
+        await segmenter.close()
+    await aclose_clients()
+    await shutdown_pdf_pool()
+
 class ChatRequest(BaseModel):
     message: str
 
@@ -100,48 +114,32 @@ async def chat(request: ChatRequest):
 # === ENDPOINT FINAL (version qui marche à 100%) ===
 @app.post("/analyze_image")
 async def analyze_image(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
-    temp_path = None
     try:
-        # 1. Sauvegarde image
-        suffix = os.path.splitext(file.filename)[1] or ".png"
-        temp_path = f"temp_{uuid.uuid4().hex}{suffix}"
+        # 1. Image gardée en mémoire (plus de fichier temporaire)
         contents = await file.read()
-        with open(temp_path, "wb") as f:
-            f.write(contents)
 
         # 2. Prédiction
-        with open(temp_path, "rb") as f:
-            files = {"file": (file.filename, f, file.content_type)}
-            async with httpx.AsyncClient(timeout=120) as client:
-                resp = await client.post("http://localhost:8000/predict", files=files)
-        
-        if resp.status_code != 200:
-            raise Exception("Erreur modèle")
-
-        result = resp.json()
+        result = await segmenter.predict(contents, file.filename, file.content_type)
 
-        # 3. Génération du BEAU rapport (on passe report_chain)
-        pdf_path = await generate_beautiful_report(result, file.filename, report_chain,temp_path)
+        # 3. Génération du BEAU rapport (on passe report_chain), PDF construit en mémoire
+        pdf = await generate_beautiful_report(result, file.filename, report_chain, contents, narratives)
 
-        # 4. Nettoyage image
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
-        # 5. Envoi + suppression après téléchargement
-        background_tasks.add_task(os.remove, pdf_path)
-
-        return FileResponse(
-            path=pdf_path,
+        # 4. Envoi direct des octets : aucun fichier à nettoyer
+        filename = f"Rapport_MedOrient_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        return Response(
+            content=pdf,
             media_type="application/pdf",
-            filename=f"Rapport_MedOrient_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
 
     except Exception as e:
-        if temp_path and os.path.exists(temp_path):
-            try: os.remove(temp_path)
-            except: pass
         raise HTTPException(status_code=500, detail=f"Erreur : {str(e)}")
                         
+@app.get("/stats")
+async def stats():
+    """Efficacité du cache des textes cliniques."""
+    return {"narrative_cache": narratives.stats()}
+
 # To clear memory if needed
 @app.post("/clear_memory")
 async def clear_memory():
@@ -0,0 +1,101 @@
+from inference_pool import QueueFull
+from collections import Counter
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Regroupe les images qui arrivent en même temps : dès qu'une image attend, on collecte
+    les suivantes pendant au plus `max_wait_ms` (ou jusqu'à `max_batch` images), puis un seul
+    forward traite le lot et chaque requête récupère son propre masque.
+    Au plus `pool.workers` lots tournent simultanément ; pendant ce temps la file se remplit,
+    donc les lots grossissent naturellement sous charge. La file est bornée à `pool.max_queue`
+    images (WOUND_MAX_QUEUE) : au-delà, QueueFull, comme pour le pool (503 côté API).
+    """
+
+    def __init__(self, forward, pool, max_batch, max_wait_ms):
+        self.forward = forward  # liste de tenseurs (3,H,W) -> np.ndarray (N,H,W)
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.images = 0
+        self.sizes = Counter()
+        self.rejected = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.pool.workers)
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def submit(self, x):
+        return (await self.submit_many([x]))[0]
+
+    async def submit_many(self, xs):
+        """
+        Toutes les images entrent dans la file, ou aucune (QueueFull) : une requête découpée
+        en fenêtres n'est jamais admise à moitié. Une file vide accepte toujours la requête,
+        même si elle a plus de fenêtres que la limite.
+        """
+        waiting = self._queue.qsize()
+        if waiting and waiting + len(xs) > self.pool.max_queue:
+            self.rejected += 1
+            raise QueueFull()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for x in xs:
+            future = loop.create_future()
+            self._queue.put_nowait((x, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        try:
+            preds = await self.pool.run(self.forward, [x for x, _ in batch])
+            for (_, future), pred in zip(batch, preds):
+                if not future.done():
+                    future.set_result(pred)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+            self.batches += 1
+            self.images += len(batch)
+            self.sizes[len(batch)] += 1
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.sizes.items())),
+            "waiting": self._queue.qsize() if self._queue else 0,
+            "max_waiting": self.pool.max_queue,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,64 @@
+"""
+Débit du micro-batching à plusieurs niveaux de concurrence (dans le processus, sans HTTP).
+
+    python bench_batching.py --concurrency 1 4 8 16 --max-batch 1 4 8 --images 64
+
+max_batch=1 correspond à l'ancien comportement (un forward par image).
+"""
+from batching import MicroBatcher
+import argparse
+import asyncio
+import time
+import torch
+
+import main  # charge le modèle et le pool d'inférence configurés par les variables WOUND_*
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def run(max_batch, max_wait_ms, concurrency, n_images):
+    batcher = MicroBatcher(main.forward_batch, main.pool, max_batch, max_wait_ms)
+    batcher.start()
+    x = torch.randint(0, 256, (3, 512, 512), dtype=torch.uint8)
+    latencies = []
+
+    async def client(n):
+        for _ in range(n):
+            t0 = time.perf_counter()
+            await batcher.submit(x)
+            latencies.append(time.perf_counter() - t0)
+
+    per_client = max(1, n_images // concurrency)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(per_client) for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    await batcher.stop()
+
+    stats = batcher.stats()
+    return len(latencies) / wall, percentile(latencies, 50), percentile(latencies, 95), stats["avg_batch_size"]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--max-wait-ms", type=float, default=main.MAX_WAIT_MS)
+    parser.add_argument("--images", type=int, default=64)
+    args = parser.parse_args()
+
+    # préchauffage (allocations, sélection des noyaux)
+    main.forward_batch([torch.randint(0, 256, (3, 512, 512), dtype=torch.uint8)])
+
+    print(f"workers={main.WORKERS}  torch_threads={main.TORCH_THREADS}  max_wait={args.max_wait_ms} ms\n")
+    print(f"{'batch':>5} {'conc.':>5} {'img/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'lot moyen':>10}")
+    for max_batch in args.max_batch:
+        for concurrency in args.concurrency:
+            rate, p50, p95, avg = asyncio.run(run(max_batch, args.max_wait_ms, concurrency, args.images))
+            print(f"{max_batch:>5} {concurrency:>5} {rate:>8.2f} {p50:>8.3f} {p95:>8.3f} {avg:>10.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,96 @@
+"""
+Compare le modèle PyTorch eager (référence) aux modèles ONNX (fp32 / int8) :
+latence par lot, débit et accord des masques (IoU par classe, pixels identiques).
+
+    python bench_engines.py --onnx best_multiclass_model.onnx best_multiclass_model.int8.onnx \
+        --images images/ --batch 1 4 --threads 4
+
+Sans --images, des images aléatoires mesurent la vitesse seulement (l'IoU n'a alors pas de sens).
+"""
+from engines import load_torch_model, TorchEngine, OnnxEngine
+from export_onnx import load_image, IMAGE_EXTS
+import numpy as np
+import argparse
+import torch
+import time
+import os
+
+# mêmes classes que main.py (importer main chargerait le modèle du service)
+CLASS_NAMES = {1: "fibrin_red", 2: "granulation_green", 3: "callus_blue"}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def load_inputs(images_dir, count):
+    if not images_dir:
+        return np.random.rand(count, 3, 512, 512).astype(np.float32)
+    paths = sorted(os.path.join(images_dir, f) for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTS))
+    return np.stack([load_image(p) for p in paths[:count]])
+
+
+def timed_run(engine, inputs, batch, repeats):
+    """Classes prédites pour toutes les images + latences de chaque lot."""
+    engine(torch.from_numpy(inputs[:batch]))  # préchauffage
+    latencies, preds = [], []
+    for r in range(repeats):
+        for i in range(0, len(inputs), batch):
+            x = torch.from_numpy(inputs[i:i + batch])
+            t0 = time.perf_counter()
+            out = engine(x)
+            latencies.append(time.perf_counter() - t0)
+            if r == 0:
+                preds.append(out)
+    return np.concatenate(preds), latencies
+
+
+def agreement(ref, pred):
+    """IoU par classe de tissu (classes absentes des deux masques ignorées) + % de pixels identiques."""
+    ious = {}
+    for c, name in CLASS_NAMES.items():
+        a, b = ref == c, pred == c
+        union = np.logical_or(a, b).sum()
+        if union:
+            ious[name] = round(float(np.logical_and(a, b).sum() / union), 4)
+    return ious, round(float((ref == pred).mean() * 100), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pth", default="best_multiclass_model.pth")
+    parser.add_argument("--onnx", nargs="+", default=["best_multiclass_model.onnx"])
+    parser.add_argument("--images", help="dossier d'images de plaies")
+    parser.add_argument("--count", type=int, default=16, help="nombre d'images")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    inputs = load_inputs(args.images, args.count)
+    device = torch.device("cpu")
+    engines = [("torch", TorchEngine(load_torch_model(args.pth, device), device))]
+    engines += [(os.path.basename(p), OnnxEngine(p, args.threads)) for p in args.onnx]
+    print(f"🧪 {len(inputs)} images, {args.threads} threads, lots {args.batch}\n")
+
+    for batch in args.batch:
+        print(f"── lot de {batch} ──")
+        reference = None
+        for name, engine in engines:
+            preds, latencies = timed_run(engine, inputs, batch, args.repeats)
+            rate = len(inputs) * args.repeats / sum(latencies)
+            line = (f"{name:<34} p50={percentile(latencies, 50) * 1000:>8.1f} ms  "
+                    f"p95={percentile(latencies, 95) * 1000:>8.1f} ms  {rate:>6.2f} img/s")
+            if reference is None:
+                reference = preds
+            else:
+                ious, same = agreement(reference, preds)
+                line += f"  pixels identiques={same}%  IoU={ious}"
+            print(line)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare les deux façons de récupérer le masque, sur un service déjà lancé :
+  - png : POST /predict puis GET mask_url (deux requêtes)
+  - rle : POST /predict?mask_format=rle (masque inclus, une requête)
+Affiche octets transférés et latence bout en bout (p50/p95), puis vérifie que le masque
+RLE décodé correspond au PNG.
+
+    python bench_payload.py photo.jpg --url http://localhost:8000 --repeats 20
+
+Le premier appel remplit le cache des résultats : les suivants mesurent donc le transfert
+et l'encodage, pas le modèle (identique dans les deux cas).
+"""
+from mask_codec import decode_rle
+from PIL import Image
+import numpy as np
+import argparse
+import httpx
+import time
+import io
+
+# mêmes classes que main.py (importer main chargerait le modèle du service)
+CLASS_NAMES = {1: "fibrin_red", 2: "granulation_green", 3: "callus_blue"}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def png_flow(client, url, files):
+    resp = client.post(f"{url}/predict", files=files)
+    resp.raise_for_status()
+    mask = client.get(resp.json()["mask_url"])
+    mask.raise_for_status()
+    return len(resp.content) + len(mask.content), mask.content
+
+
+def rle_flow(client, url, files):
+    resp = client.post(f"{url}/predict", params={"mask_format": "rle"}, files=files)
+    resp.raise_for_status()
+    return len(resp.content), resp.json()["mask"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        data = f.read()
+    files = {"file": (args.image, data, "image/jpeg")}
+
+    with httpx.Client(timeout=120) as client:
+        png_flow(client, args.url, files)  # préchauffage + cache
+        results = {}
+        for name, flow in (("png (2 requêtes)", png_flow), ("rle (1 requête)", rle_flow)):
+            latencies = []
+            for _ in range(args.repeats):
+                t0 = time.perf_counter()
+                size, mask = flow(client, args.url, files)
+                latencies.append(time.perf_counter() - t0)
+            results[name] = mask
+            print(f"{name:<18} {size:>8} octets  p50={percentile(latencies, 50) * 1000:>7.1f} ms  "
+                  f"p95={percentile(latencies, 95) * 1000:>7.1f} ms")
+
+    png = np.asarray(Image.open(io.BytesIO(results["png (2 requêtes)"])))
+    same = np.array_equal(png, decode_rle(results["rle (1 requête)"], CLASS_NAMES))
+    print(f"\n{'✅' if same else '❌'} masque RLE décodé {'identique' if same else 'différent'} du PNG")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark du préprocess, par taille d'image : ancien chemin (décodage PIL complet +
+transforms.Resize + ToTensor + torch.stack) contre le nouveau (décodage JPEG réduit,
+resize uint8, conversion dans le buffer préalloué).
+
+    python bench_preprocess.py                       # JPEG synthétiques 640x480 -> 4032x3024
+    python bench_preprocess.py --images photos/      # vraies photos
+
+Affiche le p50 de chaque chemin, le gain et l'écart moyen des tenseurs obtenus
+(le décodage réduit n'est pas bit à bit identique au décodage complet).
+"""
+from preprocessing import prepare_fast, BatchBuffer, SIZE
+from torchvision import transforms
+from PIL import Image
+import numpy as np
+import argparse
+import torch
+import time
+import io
+import os
+
+SIZES = [(640, 480), (1920, 1080), (3264, 2448), (4032, 3024)]
+
+reference_transform = transforms.Compose([
+    transforms.Resize((SIZE, SIZE)),
+    transforms.ToTensor()
+])
+
+
+def reference(data):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    return torch.stack([reference_transform(img)])
+
+
+def synthetic_jpeg(w, h):
+    """Dégradé + bruit, encodé comme un JPEG de téléphone (qualité 90)."""
+    yy, xx = np.mgrid[0:h, 0:w]
+    img = np.stack([xx * 255 // w, yy * 255 // h, (xx + yy) * 255 // (w + h)], axis=-1)
+    img = (img + np.random.randint(-20, 20, img.shape)).clip(0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(img).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def p50(fn, data, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = fn(data)
+        times.append(time.perf_counter() - t0)
+    return sorted(times)[len(times) // 2], out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="dossier de photos (sinon JPEG synthétiques)")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.images:
+        samples = []
+        for name in sorted(os.listdir(args.images)):
+            with open(os.path.join(args.images, name), "rb") as f:
+                data = f.read()
+            samples.append(("%dx%d" % Image.open(io.BytesIO(data)).size, data))
+    else:
+        samples = [(f"{w}x{h}", synthetic_jpeg(w, h)) for w, h in SIZES]
+
+    buffer = BatchBuffer(1)
+    fast = lambda data: buffer.fill([prepare_fast(data)])
+
+    print(f"{'image':>11} {'Ko':>7} {'ancien (ms)':>12} {'nouveau (ms)':>13} {'gain':>6} {'écart moyen':>12}")
+    for label, data in samples:
+        t_ref, x_ref = p50(reference, data, args.repeats)
+        t_new, x_new = p50(fast, data, args.repeats)
+        diff = (x_ref - x_new).abs().mean().item()
+        print(f"{label:>11} {len(data) / 1024:>7.0f} {t_ref * 1000:>12.1f} {t_new * 1000:>13.1f} "
+              f"{t_ref / t_new:>5.1f}x {diff:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import segmentation_models_pytorch as smp
+import numpy as np
+import torch
+
+
+def load_torch_model(path, device):
+    """DeepLabV3+ ResNet101 à 4 classes, tel qu'entraîné."""
+    model = smp.DeepLabV3Plus(
+        encoder_name="resnet101",
+        encoder_weights=None,
+        in_channels=3,
+        classes=4       # IMPORTANT : même valeur qu’au training
+    )
+    model.load_state_dict(torch.load(path, map_location=device))
+    model.to(device)
+    model.eval()
+    return model
+
+
+class TorchEngine:
+    """Forward PyTorch eager : lot (N,3,H,W) -> classes (N,H,W) uint8."""
+
+    name = "torch"
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, x):
+        with torch.no_grad():
+            logits = self.model(x.to(self.device, non_blocking=True))
+            return torch.argmax(logits, dim=1).to(torch.uint8).cpu().numpy()
+
+
+class OnnxEngine:
+    """
+    Même contrat que TorchEngine, via onnxruntime (CPU). Le modèle exporté par
+    export_onnx.py contient déjà l'argmax : la sortie est directement (N,H,W) uint8.
+    """
+
+    name = "onnx"
+
+    def __init__(self, path, threads):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.path = path
+
+    def __call__(self, x):
+        if isinstance(x, torch.Tensor):
+            x = x.numpy()
+        (classes,) = self.session.run(None, {self.input_name: np.ascontiguousarray(x, dtype=np.float32)})
+        return classes
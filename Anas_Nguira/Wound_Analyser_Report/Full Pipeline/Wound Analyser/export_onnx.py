@@ -0,0 +1,114 @@
+"""
+Export de best_multiclass_model.pth vers ONNX (axe batch dynamique, argmax inclus),
+avec quantification int8 optionnelle pour l'inférence CPU via onnxruntime.
+
+    python export_onnx.py                                   # fp32 -> best_multiclass_model.onnx
+    python export_onnx.py --quantize dynamic                # + best_multiclass_model.int8.onnx
+    python export_onnx.py --quantize static --calib-dir images/
+
+La quantification statique calibre les activations sur de vraies images de plaies
+(--calib-dir) : c'est elle qui accélère vraiment les convolutions. La dynamique ne
+quantifie que les poids et sert surtout à réduire la taille du fichier.
+
+Puis : WOUND_ENGINE=onnx WOUND_ONNX_MODEL=best_multiclass_model.int8.onnx uvicorn main:app
+"""
+from engines import load_torch_model
+from PIL import Image
+import numpy as np
+import argparse
+import torch
+import os
+
+SIZE = 512
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class SegmenterWithArgmax(torch.nn.Module):
+    """Sortie directe des classes (N,H,W) uint8 : pas de logits float à recopier hors d'onnxruntime."""
+
+    def __init__(self, net):
+        super().__init__()
+        self.net = net
+
+    def forward(self, image):
+        return torch.argmax(self.net(image), dim=1).to(torch.uint8)
+
+
+def load_image(path):
+    """Même préprocess que main.py (Resize bilinéaire 512x512 + ToTensor) : (3,512,512) float32."""
+    img = Image.open(path).convert("RGB").resize((SIZE, SIZE), Image.BILINEAR)
+    return np.asarray(img, dtype=np.float32).transpose(2, 0, 1) / 255.0
+
+
+def export(pth, out, opset):
+    model = load_torch_model(pth, torch.device("cpu"))
+    dummy = torch.rand(1, 3, SIZE, SIZE)
+    torch.onnx.export(
+        SegmenterWithArgmax(model), dummy, out,
+        input_names=["image"], output_names=["classes"],
+        dynamic_axes={"image": {0: "batch"}, "classes": {0: "batch"}},
+        opset_version=opset,
+        do_constant_folding=True,
+        dynamo=False,
+    )
+    print(f"✅ ONNX fp32 : {out} ({os.path.getsize(out) / 1e6:.1f} Mo)")
+
+
+def quantize(fp32, out, mode, calib_dir, calib_count):
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = fp32.replace(".onnx", ".prep.onnx")
+    quant_pre_process(fp32, prepared)
+
+    if mode == "dynamic":
+        quantize_dynamic(prepared, out, weight_type=QuantType.QInt8)
+    else:
+        if not calib_dir:
+            raise SystemExit("❌ --calib-dir est obligatoire pour la quantification statique")
+        paths = sorted(
+            os.path.join(calib_dir, f) for f in os.listdir(calib_dir) if f.lower().endswith(IMAGE_EXTS)
+        )[:calib_count]
+        if not paths:
+            raise SystemExit(f"❌ Aucune image dans {calib_dir}")
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self.items = iter(paths)
+
+            def get_next(self):
+                path = next(self.items, None)
+                return None if path is None else {"image": load_image(path)[None]}
+
+        print(f"📐 Calibration sur {len(paths)} images")
+        quantize_static(
+            prepared, out, Reader(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+
+    os.remove(prepared)
+    print(f"✅ ONNX int8 ({mode}) : {out} ({os.path.getsize(out) / 1e6:.1f} Mo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pth", default="best_multiclass_model.pth")
+    parser.add_argument("--out", default="best_multiclass_model.onnx")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--quantize", choices=["dynamic", "static"])
+    parser.add_argument("--calib-dir", help="images de plaies pour calibrer la quantification statique")
+    parser.add_argument("--calib-count", type=int, default=64)
+    args = parser.parse_args()
+
+    export(args.pth, args.out, args.opset)
+    if args.quantize:
+        quantize(args.out, args.out.replace(".onnx", ".int8.onnx"), args.quantize, args.calib_dir, args.calib_count)
+
+
+if __name__ == "__main__":
+    main()
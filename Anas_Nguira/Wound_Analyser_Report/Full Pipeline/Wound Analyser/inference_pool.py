@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import asyncio
+import time
+import torch
+
+
+class QueueFull(Exception):
+    """Trop d'images en attente : la requête est refusée plutôt que mise en file indéfiniment."""
+
+
+class InferencePool:
+    """
+    Exécute le décodage + l'inférence hors de la boucle asyncio, sur un nombre borné
+    de workers. Chaque worker limite torch à `torch_threads` threads (OpenMP/MKL),
+    pour que plusieurs images avancent en parallèle sans se disputer les cœurs.
+    """
+
+    def __init__(self, workers, torch_threads, max_queue):
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="inference",
+            initializer=torch.set_num_threads,
+            initargs=(torch_threads,)
+        )
+        self.pending = 0      # soumis, pas encore démarrés
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull()
+            self.pending += 1
+        submitted = time.perf_counter()
+        left_queue = False  # passe à vrai (sous verrou) quand la tâche quitte `pending`
+
+        def job():
+            nonlocal left_queue
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                if left_queue:
+                    return None  # requête annulée pendant l'attente : déjà décomptée
+                left_queue = True
+                self.pending -= 1
+                self.running += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, job)
+        except asyncio.CancelledError:
+            # annulée avant d'avoir démarré : job ne tournera pas (ou sortira aussitôt),
+            # la place dans la file est rendue ici
+            with self._lock:
+                if not left_queue:
+                    left_queue = True
+                    self.pending -= 1
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "torch_threads_per_worker": self.torch_threads,
+                "queue_depth": self.pending,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.wait_total / self.completed * 1000, 2) if self.completed else 0.0,
+                "max_wait_ms": round(self.wait_max * 1000, 2),
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
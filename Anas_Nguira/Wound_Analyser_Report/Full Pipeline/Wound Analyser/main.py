@@ -1,41 +1,73 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.staticfiles import StaticFiles
-import segmentation_models_pytorch as smp
 import torch
-from torchvision import transforms
 from PIL import Image
 import numpy as np
-import uuid, time, io, os
+import asyncio, os
+from inference_pool import InferencePool, QueueFull
+from batching import MicroBatcher
+from engines import load_torch_model, TorchEngine, OnnxEngine
+from mask_store import MaskStore, content_key
+from mask_codec import encode_rle
+from tiling import segment_tiles
+from preprocessing import prepare_fast, prepare_hires, BatchBuffer
 
 app = FastAPI(title="API segmentation multiclass")
 
-# dossier d’export
-os.makedirs("static", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# dossier d’export (chemins configurables : le module peut être importé depuis un autre dossier)
+STATIC_DIR = os.getenv("WOUND_STATIC_DIR", "static")
+MODEL_PATH = os.getenv("WOUND_MODEL_PATH", "best_multiclass_model.pth")
+
+MASK_WRITE_TIMEOUT = float(os.getenv("WOUND_MASK_WRITE_TIMEOUT", "10"))
+
+
+class MaskFiles(StaticFiles):
+    """static/ : un masque encore en cours d'écriture est attendu plutôt que renvoyé en 404."""
+
+    async def get_response(self, path, scope):
+        key = MaskStore.key_of(path)
+        if key and masks.is_pending(key):
+            await asyncio.to_thread(masks.wait, key, MASK_WRITE_TIMEOUT)
+        return await super().get_response(path, scope)
+
+
+os.makedirs(STATIC_DIR, exist_ok=True)
+app.mount("/static", MaskFiles(directory=STATIC_DIR), name="static")
+
+# ===================== POOL D'INFÉRENCE =====================
+# WOUND_WORKERS images traitées en parallèle, chacune avec WOUND_TORCH_THREADS threads torch
+
+WORKERS = int(os.getenv("WOUND_WORKERS", "2"))
+TORCH_THREADS = int(os.getenv("WOUND_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // WORKERS))))
+MAX_QUEUE = int(os.getenv("WOUND_MAX_QUEUE", "32"))
 
 # ===================== CHARGER LE VRAI MODELE =====================
+# WOUND_ENGINE=torch (eager, .pth) ou onnx (onnxruntime, modèle produit par export_onnx.py)
+
+ENGINE = os.getenv("WOUND_ENGINE", "torch")
+ONNX_MODEL = os.getenv("WOUND_ONNX_MODEL", "best_multiclass_model.onnx")
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-model = smp.DeepLabV3Plus(
-    encoder_name="resnet101",
-    encoder_weights=None,
-    in_channels=3,
-    classes=4       # IMPORTANT : même valeur qu’au training
-)
-model.load_state_dict(torch.load("best_multiclass_model.pth", map_location=device))
-model.to(device)
-model.eval()
+if ENGINE == "onnx":
+    engine = OnnxEngine(ONNX_MODEL, TORCH_THREADS)
+    print(f"🔥 Modèle ONNX chargé : {ONNX_MODEL}")
+else:
+    engine = TorchEngine(load_torch_model(MODEL_PATH, device), device)
+    print("🔥 Modèle DeepLabV3+ chargé correctement !")
+
+pool = InferencePool(WORKERS, TORCH_THREADS, MAX_QUEUE)
 
-print("🔥 Modèle DeepLabV3+ chargé correctement !")
+@app.on_event("shutdown")
+async def shutdown():
+    await batcher.stop()
+    pool.shutdown()
 
 # ===================== PREPROCESS =====================
+# décodage JPEG réduit (draft) puis resize uint8, conversion float dans un buffer préalloué ;
+# WOUND_JPEG_DRAFT=0 pour décoder en pleine résolution
 
-preprocess = transforms.Compose([
-    transforms.Resize((512, 512)),    # même resize que training
-    transforms.ToTensor()
-])
+JPEG_DRAFT = os.getenv("WOUND_JPEG_DRAFT", "1") == "1"
 
 # couleurs (classe → RGB)
 COLOR_MAP = np.array([
@@ -45,32 +77,156 @@ COLOR_MAP = np.array([
     [0, 0, 255]      # 3 = blue (callus)
 ], dtype=np.uint8)
 
+# nom de chaque classe de tissu dans la réponse
+CLASS_NAMES = {
+    1: "fibrin_red",
+    2: "granulation_green",
+    3: "callus_blue"
+}
+
 # ===================== FONCTION D'ANALYSE =====================
 
-def analyze_colors(mask_path):
-    img = Image.open(mask_path).convert("RGB")
-    arr = np.array(img)
-    h, w, _ = arr.shape
-    total = h * w
+def analyze_mask(pred):
+    """Pourcentages de chaque tissu, calculés directement sur les indices de classe (un seul passage)."""
+    counts = np.bincount(pred.ravel(), minlength=len(COLOR_MAP))
+    total = pred.size
 
-    target = {
-        (255, 0, 0): "fibrin_red",
-        (0, 255, 0): "granulation_green",
-        (0, 0, 255): "callus_blue"
-    }
+    percentages = {name: round(float(counts[c]) / total * 100, 2) for c, name in CLASS_NAMES.items()}
+    percentages["background"] = round(float(counts[0]) / total * 100, 2)
 
-    counts = {name: np.sum(np.all(arr == rgb, axis=-1)) for rgb, name in target.items()}
-    percentages = {name: round((c/total)*100, 2) for name, c in counts.items()}
+    return percentages
 
-    bg = total - sum(counts.values())
-    percentages["background"] = round((bg/total)*100, 2)
+def save_mask(pred, path):
+    """PNG palettisé (1 octet/pixel, mêmes couleurs que COLOR_MAP), compression rapide."""
+    mask_img = Image.fromarray(pred)  # mode "L", devient "P" avec la palette
+    mask_img.putpalette(COLOR_MAP.flatten().tolist())
+    mask_img.save(path, compress_level=1)
 
-    return percentages
+def load_mask(path):
+    """Relit un masque sauvegardé : le PNG palettisé redonne directement les indices de classe."""
+    return np.asarray(Image.open(path))
+
+# ===================== INFÉRENCE (exécutée dans le pool) =====================
+
+def prepare(data):
+    """Décodage + préprocess : tenseur uint8 (3,512,512)."""
+    return prepare_fast(data, JPEG_DRAFT)
+
+def forward_batch(tensors):
+    """Un seul forward (torch ou onnx) pour tout le lot : classes prédites (N,H,W) uint8."""
+    return engine(batch_buffer.fill(tensors))
+
+# ===================== MICRO-BATCHING =====================
+# jusqu'à WOUND_MAX_BATCH images regroupées, en attendant au plus WOUND_MAX_WAIT_MS
+
+MAX_BATCH = int(os.getenv("WOUND_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.getenv("WOUND_MAX_WAIT_MS", "10"))
+
+batcher = MicroBatcher(forward_batch, pool, MAX_BATCH, MAX_WAIT_MS)
+batch_buffer = BatchBuffer(MAX_BATCH)
+
+@app.on_event("startup")
+async def startup():
+    batcher.start()
+
+# ===================== MODES HAUTE RÉSOLUTION =====================
+# fast   : image ramenée à 512x512 (comme au training), un seul forward
+# tiled  : image à WOUND_HIRES_SIDE max (proportions gardées), fenêtres 512 chevauchantes recollées
+# refine : passage fast, puis fenêtres haute résolution seulement autour des frontières de tissus
+
+TILE = 512
+HIRES_SIDE = int(os.getenv("WOUND_HIRES_SIDE", "1024"))
+TILE_OVERLAP = int(os.getenv("WOUND_TILE_OVERLAP", "128"))
+MODES = ("fast", "tiled", "refine")
+
+tiles = {mode: {"requests": 0, "tiles_run": 0, "tiles_total": 0} for mode in MODES[1:]}
+
+# ===================== CACHE DES RÉSULTATS =====================
+# même upload (empreinte sha256) => même analyse et même masque, sans relancer le modèle ;
+# static/ borné à WOUND_MASK_STORE_MB Mo et WOUND_MASK_MAX_AGE secondes (LRU)
+
+MASK_STORE_MB = float(os.getenv("WOUND_MASK_STORE_MB", "500"))
+MASK_MAX_AGE = float(os.getenv("WOUND_MASK_MAX_AGE", str(7 * 24 * 3600)))
+
+# le résultat dépend du modèle servi : il fait partie de la clé
+MODEL_TAG = ENGINE if ENGINE == "torch" else os.path.basename(ONNX_MODEL)
+
+masks = MaskStore(STATIC_DIR, int(MASK_STORE_MB * 1024 * 1024), MASK_MAX_AGE)
+inflight = {}   # clé -> future partagée par les uploads identiques simultanés
 
 # ===================== ENDPOINT =====================
 
+@app.get("/stats")
+def stats():
+    """Profondeur de file et temps d'attente du pool d'inférence, batching, cache des masques."""
+    return {"engine": ENGINE, "inference_pool": pool.stats(), "batching": batcher.stats(),
+            "tiling": tiles, "mask_store": masks.stats()}
+
+async def run_model(data, key, mode):
+    # Décodage hors de la boucle asyncio, puis forwards regroupés avec les autres requêtes
+    if mode == "fast":
+        x = await pool.run(prepare, data)
+        pred = await batcher.submit(x)
+    else:
+        x, coarse_x = await pool.run(prepare_hires, data, HIRES_SIDE, mode == "refine", JPEG_DRAFT)
+        coarse = await batcher.submit(coarse_x) if coarse_x is not None else None
+        pred, run, total = await segment_tiles(x, batcher.submit_many, TILE, TILE_OVERLAP, coarse)
+        tiles[mode]["requests"] += 1
+        tiles[mode]["tiles_run"] += run
+        tiles[mode]["tiles_total"] += total
+
+    # Analyse directement sur les classes prédites
+    stats = analyze_mask(pred)
+
+    # Masque coloré écrit (et indexé) après la réponse, hors chemin critique, dans un thread
+    # à part (pas un worker d'inférence) ; static/ et le cache attendent la fin de l'écriture
+    masks.reserve(key)
+    asyncio.get_running_loop().run_in_executor(None, masks.save, key, pred, stats, save_mask)
+    return MaskStore.filename(key), stats, pred
+
+async def analyze(data, mode):
+    """
+    Cache + modèle pour une image : (nom du masque, analyse, classes ou None, depuis le cache ?).
+    Aussi appelé directement par le Report Creator quand les deux services tournent
+    dans le même processus.
+    """
+    key = content_key(data, MODEL_TAG, mode)
+    if masks.is_pending(key):
+        # même image calculée à l'instant, masque pas encore écrit
+        await asyncio.to_thread(masks.wait, key, MASK_WRITE_TIMEOUT)
+    cached = masks.lookup(key)
+    if cached:
+        filename, stats = cached
+        return filename, stats, None, True
+    if key in inflight:
+        # même image déjà en cours de traitement (ex. retry du Report Creator)
+        return (*await asyncio.shield(inflight[key]), False)
+
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        result = await run_model(data, key, mode)
+        future.set_result(result)
+        return (*result, False)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        del inflight[key]
+        if not future.done():
+            # appelant annulé (client parti, arrêt) : les requêtes en attente ne restent pas bloquées
+            future.set_exception(RuntimeError("analyse annulée"))
+        future.exception()  # erreur marquée comme lue même sans autre requête en attente
+
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(request: Request, file: UploadFile = File(...),
+                  mask_format: str = Query("png", pattern="^(png|rle)$"),
+                  mode: str = Query("fast", pattern="^(fast|tiled|refine)$")):
+    """
+    mask_format=png : masque coloré à télécharger via mask_url (deuxième requête).
+    mask_format=rle : masque de classes inclus dans la réponse (voir mask_codec.py).
+    mode=fast|tiled|refine : compromis vitesse/qualité (voir MODES HAUTE RÉSOLUTION).
+    """
 
     if not file.content_type.startswith("image/"):
         raise HTTPException(400, "Veuillez envoyer une image.")
@@ -78,32 +234,24 @@ async def predict(file: UploadFile = File(...)):
     try:
         # Lire image
         data = await file.read()
-        img = Image.open(io.BytesIO(data)).convert("RGB")
-
-        # Préprocess
-        x = preprocess(img).unsqueeze(0).to(device)
-
-        # Inférence
-        with torch.no_grad():
-            logits = model(x)
-            pred = torch.argmax(logits, dim=1).cpu().numpy()[0]  # (H,W)
-
-        # Générer masque coloré
-        color_mask = COLOR_MAP[pred]
-        mask_img = Image.fromarray(color_mask)
-
-        filename = f"mask_{int(time.time()*1000)}_{uuid.uuid4().hex[:6]}.png"
-        path = os.path.join("static", filename)
-        mask_img.save(path)
 
-        # Analyse
-        stats = analyze_colors(path)
+        filename, stats, pred, cached = await analyze(data, mode)
 
-        return {
+        response = {
             "original": file.filename,
-            "mask_url": f"http://localhost:8000/static/{filename}",
-            "analysis": stats
+            "mask_url": str(request.url_for("static", path=filename)),
+            "analysis": stats,
+            "mode": mode,
+            "cached": cached
         }
+        if mask_format == "rle":
+            if pred is None:
+                pred = await pool.run(load_mask, os.path.join(STATIC_DIR, filename))
+            response["mask"] = encode_rle(pred, CLASS_NAMES)
+        return response
 
+    except QueueFull:
+        raise HTTPException(503, "Serveur saturé, réessayez dans quelques secondes.",
+                            headers={"Retry-After": "2"})
     except Exception as e:
         raise HTTPException(500, f"Erreur interne : {e}")
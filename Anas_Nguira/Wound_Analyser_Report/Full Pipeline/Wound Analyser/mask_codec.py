@@ -0,0 +1,79 @@
+"""
+Encodage compact du masque de classes renvoyé par /predict?mask_format=rle.
+
+Pour chaque classe de tissu, le masque binaire (H,W) est parcouru ligne par ligne et
+décrit par des longueurs de plages alternées, en commençant par une plage de pixels
+*hors* classe (éventuellement 0) : [hors, dans, hors, dans, ...].
+Les longueurs sont écrites en varints LEB128 (7 bits par octet, bit de poids fort =
+« suite »), puis en base64 :
+
+    {"shape": [512, 512], "encoding": "rle-leb128-base64",
+     "classes": {"fibrin_red": "gAQK...", "granulation_green": "...", "callus_blue": "..."}}
+
+decode_rle() reconstruit le masque d'indices (n'importe quel client peut le réimplémenter
+en quelques lignes : base64 -> varints -> plages).
+"""
+import base64
+import numpy as np
+
+ENCODING = "rle-leb128-base64"
+
+
+def _runs(binary):
+    """Longueurs des plages alternées d'un vecteur booléen, en commençant par des False."""
+    n = binary.size
+    changes = np.flatnonzero(binary[1:] != binary[:-1]) + 1
+    bounds = np.concatenate(([0], changes, [n]))
+    runs = np.diff(bounds)
+    if n and binary[0]:
+        runs = np.concatenate(([0], runs))
+    return runs
+
+
+def _varints(values):
+    out = bytearray()
+    for v in values.tolist():
+        while v >= 0x80:
+            out.append((v & 0x7F) | 0x80)
+            v >>= 7
+        out.append(v)
+    return bytes(out)
+
+
+def _read_varints(data):
+    values, v, shift = [], 0, 0
+    for byte in data:
+        v |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(v)
+            v, shift = 0, 0
+    return values
+
+
+def encode_rle(pred, class_names):
+    """Masque d'indices (H,W) uint8 -> dictionnaire JSON, une RLE par classe de `class_names`."""
+    flat = pred.ravel()
+    return {
+        "shape": list(pred.shape),
+        "encoding": ENCODING,
+        "classes": {
+            name: base64.b64encode(_varints(_runs(flat == c))).decode("ascii")
+            for c, name in class_names.items()
+        },
+    }
+
+
+def decode_rle(payload, class_names):
+    """Inverse de encode_rle : masque d'indices (H,W) uint8 (0 = fond)."""
+    h, w = payload["shape"]
+    flat = np.zeros(h * w, dtype=np.uint8)
+    for c, name in class_names.items():
+        runs = _read_varints(base64.b64decode(payload["classes"][name]))
+        pos = 0
+        for i, length in enumerate(runs):
+            if i % 2:
+                flat[pos:pos + length] = c
+            pos += length
+    return flat.reshape(h, w)
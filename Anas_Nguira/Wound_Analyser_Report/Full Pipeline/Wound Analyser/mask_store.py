@@ -0,0 +1,149 @@
+from collections import OrderedDict
+import threading
+import hashlib
+import time
+import os
+
+
+def content_key(data, *variant):
+    """Empreinte des octets envoyés (+ ce qui change le résultat : moteur, mode...)."""
+    h = hashlib.sha256(data)
+    for v in variant:
+        h.update(b"\0" + str(v).encode())
+    return h.hexdigest()[:32]
+
+
+class MaskStore:
+    """
+    Masques rangés sous static/mask_<empreinte>.png, avec l'analyse associée en mémoire :
+    un même upload renvoie directement le résultat précédent.
+    Taille totale bornée (`max_bytes`) et âge borné (`max_age` secondes), éviction LRU.
+    Les PNG déjà présents au démarrage sont comptés (et évincés) mais ne servent pas de
+    résultat : leur analyse n'est plus en mémoire.
+
+    L'écriture se fait après la réponse : `reserve` la déclare en cours, `wait` attend
+    qu'elle soit finie (lecture du masque ou upload identique entre-temps).
+    """
+
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.entries = OrderedDict()   # clé -> {"filename", "size", "created", "analysis"}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted_size = 0
+        self.evicted_age = 0
+        self.pending = {}              # clé -> threading.Event, masque en cours d'écriture
+        self._lock = threading.Lock()
+        self._scan()
+
+    @staticmethod
+    def filename(key):
+        return f"mask_{key}.png"
+
+    @staticmethod
+    def key_of(filename):
+        name = os.path.basename(filename)
+        if name.startswith("mask_") and name.endswith(".png"):
+            return name[len("mask_"):-len(".png")]
+        return None
+
+    def reserve(self, key):
+        """Déclare l'écriture de ce masque en cours (avant de lancer save en arrière-plan)."""
+        with self._lock:
+            self.pending.setdefault(key, threading.Event())
+
+    def is_pending(self, key):
+        return key in self.pending
+
+    def wait(self, key, timeout=None):
+        """Bloque jusqu'à la fin de l'écriture en cours de ce masque (s'il y en a une)."""
+        event = self.pending.get(key)
+        if event is not None:
+            event.wait(timeout)
+
+    def _scan(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.startswith("mask_") and name.endswith(".png"):
+                st = os.stat(os.path.join(self.directory, name))
+                files.append((st.st_mtime, name, st.st_size))
+        for mtime, name, size in sorted(files):
+            self.entries[name[len("mask_"):-len(".png")]] = {
+                "filename": name, "size": size, "created": mtime, "analysis": None
+            }
+            self.bytes += size
+        with self._lock:
+            self._evict()
+
+    def lookup(self, key):
+        """(filename, analysis) si le masque est encore là, sinon None."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["analysis"] is None:
+                self.misses += 1
+                return None
+            expired = time.time() - entry["created"] > self.max_age
+            if expired or not os.path.exists(os.path.join(self.directory, entry["filename"])):
+                self._remove(key)
+                self.evicted_age += expired
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["filename"], entry["analysis"]
+
+    def save(self, key, pred, analysis, writer):
+        """Écrit le masque via `writer(pred, path)` puis l'enregistre (appelé hors chemin critique)."""
+        filename = self.filename(key)
+        path = os.path.join(self.directory, filename)
+        try:
+            writer(pred, path)
+            size = os.path.getsize(path)
+            with self._lock:
+                if key in self.entries:
+                    self.bytes -= self.entries.pop(key)["size"]
+                self.entries[key] = {"filename": filename, "size": size, "created": time.time(), "analysis": analysis}
+                self.bytes += size
+                self._evict()
+        finally:
+            # même en cas d'échec : personne ne reste bloqué (le masque sera simplement recalculé)
+            with self._lock:
+                event = self.pending.pop(key, None)
+            if event is not None:
+                event.set()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry["size"]
+        try:
+            os.remove(os.path.join(self.directory, entry["filename"]))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, e in self.entries.items() if now - e["created"] > self.max_age]:
+            self._remove(key)
+            self.evicted_age += 1
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            self._remove(next(iter(self.entries)))
+            self.evicted_size += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "max_age_s": self.max_age,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evicted_size": self.evicted_size,
+                "evicted_age": self.evicted_age,
+                "pending_writes": len(self.pending),
+            }
@@ -0,0 +1,72 @@
+from PIL import Image
+import numpy as np
+import threading
+import torch
+import io
+
+SIZE = 512   # même taille qu'au training
+
+
+def decode(data, target, draft=True):
+    """
+    Décode l'upload en RGB. Pour un JPEG, `draft` demande au décodeur une réduction DCT
+    (1/2, 1/4 ou 1/8) qui reste au moins à `target` : une photo 12 MP n'est jamais
+    décodée en pleine résolution quand on n'en garde que 512 px. Sans effet sur PNG/WebP.
+    """
+    img = Image.open(io.BytesIO(data))
+    if draft:
+        img.draft("RGB", target)
+    return img.convert("RGB")
+
+
+def to_chw(img):
+    """Image PIL RGB -> tenseur uint8 (3,H,W) : pas de float avant le lot."""
+    return torch.from_numpy(np.array(img)).permute(2, 0, 1)
+
+
+def prepare_fast(data, draft=True):
+    """Upload -> tenseur uint8 (3,512,512), resize bilinéaire directement sur les octets."""
+    img = decode(data, (SIZE, SIZE), draft)
+    return to_chw(img.resize((SIZE, SIZE), Image.BILINEAR))
+
+
+def prepare_hires(data, max_side, with_coarse, draft=True):
+    """
+    Image réduite d'un même facteur sur les deux côtés (proportions gardées) pour que le
+    plus grand fasse au plus `max_side`, jamais agrandie, sauf si le plus petit côté
+    tomberait sous SIZE : il est alors ramené à SIZE (une fenêtre entière par axe).
+    + la version SIZExSIZE du passage rapide si `with_coarse`.
+    """
+    img = Image.open(io.BytesIO(data))
+    w, h = img.size
+    scale = max(min(1.0, max_side / max(w, h)), SIZE / min(w, h))
+    size = (max(SIZE, round(w * scale)), max(SIZE, round(h * scale)))
+    if draft:
+        img.draft("RGB", size)
+    img = img.convert("RGB")
+    x = to_chw(img.resize(size, Image.BILINEAR))
+    return x, (to_chw(img.resize((SIZE, SIZE), Image.BILINEAR)) if with_coarse else None)
+
+
+class BatchBuffer:
+    """
+    Tenseur d'entrée (max_batch,3,SIZE,SIZE) float32 préalloué une fois par thread du pool
+    (mémoire épinglée si CUDA, pour un transfert asynchrone) : les images uint8 y sont
+    converties sur place, sans tenseur float intermédiaire par requête.
+    """
+
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self.pin = torch.cuda.is_available()
+        self._local = threading.local()
+
+    def fill(self, tensors):
+        n = len(tensors)
+        if n > self.max_batch or any(t.shape != (3, SIZE, SIZE) for t in tensors):
+            return torch.stack(tensors).float().div_(255)
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = torch.empty((self.max_batch, 3, SIZE, SIZE), pin_memory=self.pin)
+        for i, t in enumerate(tensors):
+            buf[i].copy_(t)
+        return buf[:n].mul_(1 / 255)
@@ -0,0 +1,67 @@
+import numpy as np
+
+
+def tile_spans(length, tile, overlap):
+    """
+    Découpe un axe en fenêtres de `tile` pixels qui se chevauchent de `overlap`.
+    Chaque fenêtre ne garde que sa partie centrale : (début, garder_de, garder_à),
+    la frontière entre deux fenêtres étant au milieu de leur chevauchement.
+    """
+    if length <= tile:
+        return [(0, 0, length)]
+    stride = tile - overlap
+    starts = list(range(0, length - tile, stride)) + [length - tile]
+    spans = []
+    for k, start in enumerate(starts):
+        keep_from = 0 if k == 0 else (starts[k - 1] + tile + start) // 2
+        keep_to = length if k == len(starts) - 1 else (start + tile + starts[k + 1]) // 2
+        spans.append((start, keep_from, keep_to))
+    return spans
+
+
+def class_edges(mask):
+    """Pixels dont un voisin (4-connexité) a une autre classe."""
+    edges = np.zeros(mask.shape, dtype=bool)
+    dy = mask[:-1] != mask[1:]
+    dx = mask[:, :-1] != mask[:, 1:]
+    edges[:-1] |= dy
+    edges[1:] |= dy
+    edges[:, :-1] |= dx
+    edges[:, 1:] |= dx
+    return edges
+
+
+async def segment_tiles(x, submit_many, tile, overlap, coarse=None):
+    """
+    Segmente x (3,H,W) par fenêtres `tile`x`tile` envoyées ensemble à `submit_many` (le micro-batcher :
+    la mémoire de pointe reste celle d'un lot, quelle que soit la taille de l'image).
+    Les classes de chaque fenêtre sont recollées sur leur partie centrale.
+
+    Avec `coarse` (masque du passage rapide en basse résolution), seules les fenêtres
+    qui contiennent une frontière entre classes sont recalculées ; ailleurs on garde le
+    masque grossier agrandi. Renvoie (masque (H,W) uint8, fenêtres calculées, fenêtres totales).
+    """
+    _, h, w = x.shape
+    if coarse is None:
+        out = np.zeros((h, w), dtype=np.uint8)
+    else:
+        ch, cw = coarse.shape
+        out = coarse[(np.arange(h) * ch // h)[:, None], (np.arange(w) * cw // w)[None, :]]
+        edges = class_edges(coarse)
+
+    jobs, total = [], 0
+    for ys, yf, yt in tile_spans(h, tile, overlap):
+        for xs, xf, xt in tile_spans(w, tile, overlap):
+            total += 1
+            if coarse is not None:
+                # zone gardée par la fenêtre, ramenée au masque grossier (+1 pixel de marge)
+                region = edges[max(0, yf * ch // h - 1):yt * ch // h + 2,
+                               max(0, xf * cw // w - 1):xt * cw // w + 2]
+                if not region.any():
+                    continue
+            jobs.append((ys, yf, yt, xs, xf, xt))
+
+    preds = await submit_many([x[:, ys:ys + tile, xs:xs + tile] for ys, _, _, xs, _, _ in jobs])
+    for pred, (ys, yf, yt, xs, xf, xt) in zip(preds, jobs):
+        out[yf:yt, xf:xt] = pred[yf - ys:yt - ys, xf - xs:xt - xs]
+    return out, len(jobs), total